@@ -2,25 +2,55 @@
 Student Life Organizer - Main Flask Application with Authentication
 A simple web app for university students to organize courses and tasks
 """
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, flash, stream_with_context
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_mail import Mail
-from threading import Thread
-from datetime import datetime
+from markupsafe import Markup
+from datetime import datetime, time, timedelta, timezone
+from werkzeug.http import is_resource_modified
+from werkzeug.middleware.proxy_fix import ProxyFix
+import base64
+from zoneinfo import available_timezones
+import hashlib
+import hmac
 import os
 from dotenv import load_dotenv
-from models import db, User, Course, Task
+from sqlalchemy import case, tuple_, update
+from sqlalchemy.orm import contains_eager
+from models import db, User, Course, Task, TASK_STATUSES, TASK_PRIORITIES, URGENCY_LEVELS, URGENT_DAYS, current_date, urgency_bounds
 from database import init_db
-from notifications import check_and_send_notifications
+from routing import primary_reads, read_only
+from notifications import check_and_send_notifications, prune_sent_reminders, build_notification_message, task_email_data, REMINDER_RULES
+from delivery import create_delivery
+from email_queue import EmailQueue
+from cache import ResponseCache, UserCache
+from passwords import hasher, HashingBusy
+from ratelimit import RateLimiter
+from scheduler import Scheduler
+import export
+import revisions
+import task_import
 
 # Load environment variables from .env file
 load_dotenv()
 
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///student_organizer.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///student_organizer.db').replace('postgres://', 'postgresql://', 1)
+# Optional comma-separated read replicas used by the read-only pages and APIs
+app.config['DATABASE_REPLICA_URLS'] = [
+    url.strip().replace('postgres://', 'postgresql://', 1)
+    for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()
+]
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SECRET_KEY'] = 'your-secret-key-change-this-in-production'
 
+# Database tuning (SQLite pragmas applied to every connection, connection pool size)
+app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+app.config['SQLITE_CACHE_SIZE_KB'] = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 65536))
+app.config['SQLITE_MMAP_SIZE'] = int(os.environ.get('SQLITE_MMAP_SIZE', 268435456))
+app.config['SQLALCHEMY_POOL_SIZE'] = int(os.environ.get('SQLALCHEMY_POOL_SIZE', 5))
+app.config['SQLALCHEMY_MAX_OVERFLOW'] = int(os.environ.get('SQLALCHEMY_MAX_OVERFLOW', 10))
+
 # Email configuration
 app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
 app.config['MAIL_PORT'] = int(os.environ.get('MAIL_PORT', 587))
@@ -29,55 +59,132 @@ app.config['MAIL_USERNAME'] = os.environ.get('MAIL_USERNAME', '')
 app.config['MAIL_PASSWORD'] = os.environ.get('MAIL_PASSWORD', '')
 app.config['MAIL_DEFAULT_SENDER'] = os.environ.get('MAIL_DEFAULT_SENDER', 'noreply@studentorganizer.com')
 
+# Pooled SMTP delivery: connections kept open, messages per connection, sending threads
+app.config['MAIL_POOL_SIZE'] = int(os.environ.get('MAIL_POOL_SIZE', 2))
+app.config['MAIL_POOL_MAX_MESSAGES'] = int(os.environ.get('MAIL_POOL_MAX_MESSAGES', 100))
+app.config['MAIL_DELIVERY_WORKERS'] = int(os.environ.get('MAIL_DELIVERY_WORKERS', 2))
+
+# Mail transport: 'pool' (threads over pooled connections) or 'async'
+# (asyncio sessions, needs aiosmtplib) and its concurrent SMTP sessions
+app.config['MAIL_TRANSPORT'] = os.environ.get('MAIL_TRANSPORT', 'pool')
+app.config['MAIL_ASYNC_CONCURRENCY'] = int(os.environ.get('MAIL_ASYNC_CONCURRENCY', 20))
+
+# Outbound email queue
+app.config['EMAIL_QUEUE_ENABLED'] = os.environ.get('EMAIL_QUEUE_ENABLED', 'True') == 'True'
+app.config['EMAIL_QUEUE_WORKERS'] = int(os.environ.get('EMAIL_QUEUE_WORKERS', 1))
+app.config['EMAIL_QUEUE_MAX_ATTEMPTS'] = int(os.environ.get('EMAIL_QUEUE_MAX_ATTEMPTS', 5))
+app.config['EMAIL_QUEUE_BACKOFF_SECONDS'] = int(os.environ.get('EMAIL_QUEUE_BACKOFF_SECONDS', 30))
+
+# Scheduled jobs (cron syntax, server local time)
+app.config['SCHEDULER_ENABLED'] = os.environ.get('SCHEDULER_ENABLED', 'True') == 'True'
+app.config['REMINDER_SCHEDULE'] = os.environ.get('REMINDER_SCHEDULE', '*/15 * * * *')
+app.config['REMINDER_SHARDS_PER_HOUR'] = int(os.environ.get('REMINDER_SHARDS_PER_HOUR', 4))
+# Days the sent_reminders ledger keeps rows past their due date
+app.config['SENT_REMINDER_RETENTION_DAYS'] = int(os.environ.get('SENT_REMINDER_RETENTION_DAYS', 30))
+app.config['SCHEDULER_POLL_SECONDS'] = int(os.environ.get('SCHEDULER_POLL_SECONDS', 30))
+app.config['SCHEDULER_LOCK_SECONDS'] = int(os.environ.get('SCHEDULER_LOCK_SECONDS', 3600))
+app.config['SCHEDULER_CATCHUP_HOURS'] = int(os.environ.get('SCHEDULER_CATCHUP_HOURS', 12))
+app.config['SCHEDULER_MAX_ATTEMPTS'] = int(os.environ.get('SCHEDULER_MAX_ATTEMPTS', 3))
+
+# Per-user response cache ('memory' or 'redis')
+app.config['RESPONSE_CACHE_ENABLED'] = os.environ.get('RESPONSE_CACHE_ENABLED', 'True') == 'True'
+app.config['RESPONSE_CACHE_BACKEND'] = os.environ.get('RESPONSE_CACHE_BACKEND', 'memory')
+app.config['RESPONSE_CACHE_URL'] = os.environ.get('RESPONSE_CACHE_URL', 'redis://localhost:6379/0')
+app.config['RESPONSE_CACHE_TTL'] = int(os.environ.get('RESPONSE_CACHE_TTL', 300))
+app.config['RESPONSE_CACHE_SIZE'] = int(os.environ.get('RESPONSE_CACHE_SIZE', 1024))
+
+# Password hashing (werkzeug method string, including its cost parameters).
+# A request waiting on a hash holds its request thread, so keep
+# WORKERS + QUEUE_SIZE below the gunicorn --threads count (2 in the Procfile)
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 1))
+app.config['PASSWORD_HASH_QUEUE_SIZE'] = int(os.environ.get('PASSWORD_HASH_QUEUE_SIZE', 0))
+
+# Login/registration rate limits ('memory' or 'redis' bucket store)
+app.config['RATE_LIMIT_ENABLED'] = os.environ.get('RATE_LIMIT_ENABLED', 'True') == 'True'
+app.config['RATE_LIMIT_BACKEND'] = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+app.config['RATE_LIMIT_URL'] = os.environ.get('RATE_LIMIT_URL', 'redis://localhost:6379/0')
+app.config['RATE_LIMIT_IP_BURST'] = int(os.environ.get('RATE_LIMIT_IP_BURST', 20))
+app.config['RATE_LIMIT_IP_PER_MINUTE'] = int(os.environ.get('RATE_LIMIT_IP_PER_MINUTE', 10))
+app.config['RATE_LIMIT_USERNAME_BURST'] = int(os.environ.get('RATE_LIMIT_USERNAME_BURST', 5))
+app.config['RATE_LIMIT_USERNAME_PER_MINUTE'] = int(os.environ.get('RATE_LIMIT_USERNAME_PER_MINUTE', 5))
+
+# Reverse proxies in front of the app (1 on Render/Heroku). Their X-Forwarded-For
+# entries are trusted for the client IP, which the rate limits are keyed on;
+# leave at 0 when clients connect directly, or the header could be spoofed
+app.config['TRUSTED_PROXY_HOPS'] = int(os.environ.get('TRUSTED_PROXY_HOPS', 0))
+
+# Logged-in user cache (USER_CACHE_TTL=0 disables it)
+app.config['USER_CACHE_TTL'] = int(os.environ.get('USER_CACHE_TTL', 60))
+app.config['USER_CACHE_SIZE'] = int(os.environ.get('USER_CACHE_SIZE', 1024))
+
+# Who may read /api/metrics: logged-in users listed in ADMIN_USERNAMES
+# (comma-separated), or a monitor sending "Authorization: Bearer <METRICS_TOKEN>"
+app.config['ADMIN_USERNAMES'] = {
+    name.strip() for name in os.environ.get('ADMIN_USERNAMES', '').split(',') if name.strip()
+}
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN', '')
+
+# Take the client IP and scheme from the trusted proxies' X-Forwarded-* headers
+if app.config['TRUSTED_PROXY_HOPS']:
+    hops = app.config['TRUSTED_PROXY_HOPS']
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops, x_host=hops)
+
 # Initialize database
 init_db(app)
 
+# Initialize the password hashing pool and the login rate limiter
+hasher.init_app(app)
+rate_limiter = RateLimiter(app)
+
 # Initialize Flask-Mail
 mail = Mail(app)
+delivery = create_delivery(mail, app.config)
 
-# Initialize Flask-Login
-login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'login'
+# Initialize the outbound email queue (workers drain it in the background)
+email_queue = EmailQueue(app, delivery)
+if app.config['EMAIL_QUEUE_ENABLED']:
+    email_queue.start()
 
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
+# Initialize the scheduler; one worker across all processes runs each job
+scheduler = Scheduler(app)
 
+def send_due_reminders(window_start, window_end):
+    """Scheduled job: email the users whose local reminder time falls in this slot"""
+    sent, failed = check_and_send_notifications(mail, delivery, window_start, window_end)
+    pruned = prune_sent_reminders(app.config['SENT_REMINDER_RETENTION_DAYS'])
+    return f'sent={sent} failed={failed} pruned={pruned}'
 
-# ============================================================================
-# ASYNC EMAIL HELPER
-# ============================================================================
+scheduler.add_job('reminders', app.config['REMINDER_SCHEDULE'], send_due_reminders)
+if app.config['SCHEDULER_ENABLED']:
+    scheduler.start()
 
-def send_async_email(flask_app, mail_instance, user_email, user_name, tasks_data):
-    """Send email in background thread to avoid blocking
-    
-    Args:
-        flask_app: Flask app instance
-        mail_instance: Flask-Mail instance
-        user_email: User's email address (string)
-        user_name: User's name (string)
-        tasks_data: List of task dictionaries with extracted data (NOT database objects)
-    """
-    with flask_app.app_context():
-        try:
-            from notifications import send_notification_email_direct
-            send_notification_email_direct(mail_instance, user_email, user_name, tasks_data)
-            print(f"✓ Email sent successfully to {user_email}")
-        except Exception as e:
-            print(f"✗ Email sending failed: {str(e)}")
-            import traceback
-            traceback.print_exc()
+# Track per-user data revisions and invalidate the response cache from them
+revisions.register(db.session)
+response_cache = ResponseCache(app)
+response_cache.register_invalidation()
 
+# Initialize Flask-Login, loading the current user through the user cache
+user_cache = UserCache(app)
+login_manager = LoginManager()
+login_manager.init_app(app)
+login_manager.login_view = 'login'
 
+@login_manager.user_loader
+def load_user(user_id):
+    return user_cache.load(int(user_id))
 
 
+# IANA time zones users can choose for their reminders (the list comes from the
+# tzdata package on systems without a time zone database, such as Windows)
+TIMEZONES = sorted(available_timezones() | {'UTC'})
 
 # ============================================================================
 # AUTHENTICATION ROUTES
 # ============================================================================
 
 @app.route('/register', methods=['GET', 'POST'])
+@rate_limiter.limit
 def register():
     """User registration"""
     if current_user.is_authenticated:
@@ -102,9 +209,16 @@ def register():
             flash('Email already registered', 'error')
             return render_template('register.html')
         
-        # Create new user
-        user = User(username=username, email=email)
-        user.set_password(password)
+        # Create new user, in the browser's time zone when it is a known one
+        timezone_name = request.form.get('timezone', 'UTC')
+        if timezone_name not in TIMEZONES:
+            timezone_name = 'UTC'
+        user = User(username=username, email=email, timezone=timezone_name)
+        try:
+            user.set_password(password)
+        except HashingBusy:
+            flash('The server is busy, please try again in a moment', 'error')
+            return render_template('register.html'), 503
         db.session.add(user)
         db.session.commit()
         
@@ -115,6 +229,7 @@ def register():
 
 
 @app.route('/login', methods=['GET', 'POST'])
+@rate_limiter.limit
 def login():
     """User login"""
     if current_user.is_authenticated:
@@ -126,7 +241,20 @@ def login():
         
         user = User.query.filter_by(username=username).first()
         
-        if user and user.check_password(password):
+        try:
+            valid = user is not None and user.check_password(password)
+        except HashingBusy:
+            flash('The server is busy, please try again in a moment', 'error')
+            return render_template('login.html'), 503
+        
+        if valid:
+            # Upgrade hashes made with an older method or cost
+            if hasher.needs_rehash(user.password_hash):
+                try:
+                    user.set_password(password)
+                    db.session.commit()
+                except HashingBusy:
+                    pass
             login_user(user)
             return redirect(url_for('dashboard'))
         else:
@@ -139,6 +267,7 @@ def login():
 @login_required
 def logout():
     """User logout"""
+    user_cache.invalidate(current_user.id)
     logout_user()
     flash('You have been logged out', 'success')
     return redirect(url_for('login'))
@@ -148,7 +277,7 @@ def logout():
 @login_required
 def profile():
     """User profile page"""
-    return render_template('profile.html', user=current_user)
+    return render_template('profile.html', user=current_user, timezones=TIMEZONES, reminder_rules=REMINDER_RULES)
 
 
 @app.route('/profile/edit', methods=['POST'])
@@ -184,10 +313,6 @@ def edit_profile():
                 flash('All password fields are required', 'error')
                 return redirect(url_for('profile'))
             
-            if not current_user.check_password(current_password):
-                flash('Current password is incorrect', 'error')
-                return redirect(url_for('profile'))
-            
             if new_password != confirm_password:
                 flash('New passwords do not match', 'error')
                 return redirect(url_for('profile'))
@@ -196,16 +321,51 @@ def edit_profile():
                 flash('Password must be at least 6 characters', 'error')
                 return redirect(url_for('profile'))
             
-            current_user.set_password(new_password)
+            try:
+                if not current_user.check_password(current_password):
+                    flash('Current password is incorrect', 'error')
+                    return redirect(url_for('profile'))
+                current_user.set_password(new_password)
+            except HashingBusy:
+                flash('The server is busy, please try again in a moment', 'error')
+                return render_template('profile.html', user=current_user, timezones=TIMEZONES,
+                                       reminder_rules=REMINDER_RULES), 503
             db.session.commit()
             flash('Password changed successfully', 'success')
         
+        elif action == 'update_reminders':
+            timezone_name = request.form.get('timezone')
+            try:
+                notification_hour = int(request.form.get('notification_hour', ''))
+            except ValueError:
+                notification_hour = None
+            rules = request.form.getlist('reminder_rules')
+            
+            if timezone_name not in TIMEZONES:
+                flash('Unknown time zone', 'error')
+                return redirect(url_for('profile'))
+            
+            if notification_hour is None or not 0 <= notification_hour <= 23:
+                flash('Reminder hour must be between 0 and 23', 'error')
+                return redirect(url_for('profile'))
+            
+            if any(rule not in REMINDER_RULES for rule in rules):
+                flash('Unknown reminder', 'error')
+                return redirect(url_for('profile'))
+            
+            current_user.timezone = timezone_name
+            current_user.notification_hour = notification_hour
+            current_user.reminder_rules = ','.join(rule for rule in REMINDER_RULES if rule in rules)
+            db.session.commit()
+            flash(f'Reminders will arrive at {notification_hour:02d}:00 {timezone_name}', 'success')
+        
         elif action == 'toggle_notifications':
             current_user.email_notifications_enabled = not current_user.email_notifications_enabled
             db.session.commit()
             status = 'enabled' if current_user.email_notifications_enabled else 'disabled'
             flash(f'Email notifications {status}', 'success')
         
+        user_cache.invalidate(current_user.id)
         return redirect(url_for('profile'))
     
     except Exception as e:
@@ -234,9 +394,8 @@ def test_notifications():
             flash('Email not configured. Please set up environment variables on Render.', 'error')
             return redirect(url_for('dashboard'))
         
-        # Get tasks due tomorrow for current user
-        from datetime import date, timedelta
-        tomorrow = date.today() + timedelta(days=1)
+        # Get tasks due tomorrow, in the user's time zone, for current user
+        tomorrow = current_user.local_today() + timedelta(days=1)
         
         tasks_due_tomorrow = Task.query.join(Course).filter(
             Course.user_id == current_user.id,
@@ -248,28 +407,17 @@ def test_notifications():
             flash('No tasks due tomorrow. Create a task with tomorrow\'s date to test email!', 'error')
             return redirect(url_for('dashboard'))
         
-        # CRITICAL: Extract all data from database objects BEFORE threading
-        # This prevents "detached instance" errors when the session closes
-        tasks_data = []
-        for task in tasks_due_tomorrow:
-            tasks_data.append({
-                'title': task.title,
-                'description': task.description or '',
-                'priority': task.priority,
-                'task_type': task.task_type,
-                'course_name': task.course.name,
-                'due_date': str(task.due_date)
-            })
-        
-        # Send email in background thread (non-blocking)
-        print(f"DEBUG: Sending email for {len(tasks_data)} task(s) in background thread...")
-        thr = Thread(
-            target=send_async_email,
-            args=[app, mail, current_user.email, current_user.username, tasks_data]
-        )
-        thr.start()
+        # Extract plain data from database objects for the email body
+        tasks_data = [task_email_data(task) for task in tasks_due_tomorrow]
+        
+        # Journal the email; a queue worker delivers it in the background
+        msg = build_notification_message(current_user.email, current_user.username, tasks_data)
+        dedup_key = f'test-reminder:{current_user.id}:{tomorrow.isoformat()}'
+        if not email_queue.enqueue(msg, dedup_key):
+            flash('A reminder for tomorrow\'s tasks is already queued or sent. Check your email.', 'error')
+            return redirect(url_for('dashboard'))
         
-        flash(f'Email notification sent in background for {len(tasks_data)} task(s)! Check your email.', 'success')
+        flash(f'Email notification queued for {len(tasks_data)} task(s)! Check your email.', 'success')
         return redirect(url_for('dashboard'))
     except Exception as e:
         error_msg = f'Error sending test notification: {str(e)}'
@@ -281,18 +429,167 @@ def test_notifications():
 
 
 
+# ============================================================================
+# QUERY HELPERS
+# ============================================================================
+
+def user_tasks_query(user_id):
+    """Tasks from a user's courses, with each task's course loaded by the same query"""
+    return Task.query.join(Course).filter(Task.user_id == user_id).options(contains_eager(Task.course))
+
+
+TASKS_PAGE_SIZE = 100
+TASKS_MAX_PAGE_SIZE = 500
+
+# Most pressing tasks shown on the dashboard before any section is opened
+DASHBOARD_TOP_TASKS = 5
+
+
+def parse_date_arg(value, name):
+    """Parse a YYYY-MM-DD request argument"""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f'{name} must be a date in YYYY-MM-DD format')
+
+
+def filter_tasks_query(query, args):
+    """Apply the task list filters supported by the API to a task query"""
+    for field in ('task_type', 'status', 'priority'):
+        if args.get(field):
+            query = query.filter(getattr(Task, field) == args[field])
+    if args.get('course_id'):
+        try:
+            query = query.filter(Task.course_id == int(args['course_id']))
+        except ValueError:
+            raise ValueError('course_id must be an integer')
+    if args.get('due_after'):
+        query = query.filter(Task.due_date >= parse_date_arg(args['due_after'], 'due_after'))
+    if args.get('due_before'):
+        query = query.filter(Task.due_date <= parse_date_arg(args['due_before'], 'due_before'))
+    if args.get('urgency'):
+        first, last = urgency_bounds(args['urgency'], current_date())
+        if first is not None:
+            query = query.filter(Task.due_date >= first)
+        if last is not None:
+            query = query.filter(Task.due_date <= last)
+    return query
+
+
+def encode_task_cursor(task):
+    """Opaque keyset cursor pointing just after a task in (due_date, id) order"""
+    raw = f'{task.due_date.isoformat()}:{task.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_task_cursor(cursor):
+    """Decode a cursor made by encode_task_cursor into (due_date, task_id)"""
+    try:
+        due_date_str, task_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(':')
+        return datetime.strptime(due_date_str, '%Y-%m-%d').date(), int(task_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+
+def conditional_json_response(name, build_body):
+    """Serve a per-user JSON body with revision-based ETag and Last-Modified validators
+    
+    The validators come from the user's data revision, so a matching
+    If-None-Match or If-Modified-Since is answered with 304 after one
+    primary-key lookup, before anything is queried or serialised. Bodies
+    are served from the response cache.
+    
+    build_body returns the JSON text and may raise ValueError for bad request arguments.
+    """
+    # From the primary, so a lagging replica cannot confirm a stale ETag
+    with primary_reads():
+        revision, updated_at = revisions.get_revision(db.session, current_user.id)
+    today = current_date()
+    etag = hashlib.sha1(
+        f'{name}:{current_user.id}:{revision}:{today.isoformat()}:'.encode() + request.query_string
+    ).hexdigest()
+    # Days remaining change at (server local) midnight, so nothing is older
+    # than today's midnight; updated_at is naive UTC
+    last_modified = datetime.combine(today, time.min).astimezone(timezone.utc)
+    if updated_at is not None:
+        last_modified = max(last_modified, updated_at.replace(tzinfo=timezone.utc))
+    
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = app.response_class(status=304)
+    else:
+        try:
+            body = response_cache.get_or_set(
+                response_cache.key(current_user.id, name, request.query_string), build_body
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
 # ============================================================================
 # DASHBOARD ROUTES
 # ============================================================================
 
 @app.route('/')
 @login_required
+@read_only
 def dashboard():
-    """Main dashboard showing all tasks sorted by due date"""
-    # Only show tasks from current user's courses
-    tasks = Task.query.join(Course).filter(Course.user_id == current_user.id).order_by(Task.due_date).all()
-    courses = Course.query.filter_by(user_id=current_user.id).all()
-    return render_template('dashboard.html', tasks=tasks, courses=courses)
+    """Main dashboard: counts per urgency level, course, type and status plus the most pressing tasks
+    
+    The full task list of each urgency level is loaded on demand from dashboard_tasks().
+    """
+    task_type = request.args.get('task_type', '')
+    
+    def render_summary():
+        today = current_date()
+        summary = Task.summary_counts(current_user.id, today, task_type)
+        query = user_tasks_query(current_user.id).filter(
+            Task.status != 'completed',
+            Task.due_date <= today + timedelta(days=URGENT_DAYS)
+        )
+        if task_type:
+            query = query.filter(Task.task_type == task_type)
+        top_tasks = query.order_by(Task.due_date, Task.id).limit(DASHBOARD_TOP_TASKS).all()
+        return render_template(
+            '_dashboard_summary.html',
+            summary=summary,
+            top_tasks=Task.annotate_urgency(top_tasks, today),
+            urgency_levels=URGENCY_LEVELS,
+            task_type=task_type
+        )
+    
+    key = response_cache.key(current_user.id, 'dashboard_summary', task_type)
+    summary_html = Markup(response_cache.get_or_set(key, render_summary))
+    return render_template('dashboard.html', summary_html=summary_html, task_type=task_type)
+
+
+@app.route('/dashboard/tasks')
+@login_required
+@read_only
+def dashboard_tasks():
+    """Task cards for one dashboard section, as an HTML fragment
+    
+    Query parameters:
+        urgency: overdue, urgent, soon or later (required)
+        task_type: optional type filter, as on the dashboard
+    """
+    if not request.args.get('urgency'):
+        return jsonify({'error': 'urgency is required'}), 400
+    
+    def render_tasks():
+        query = filter_tasks_query(user_tasks_query(current_user.id), request.args)
+        tasks = query.order_by(Task.due_date, Task.id).all()
+        return render_template('_dashboard_tasks.html', tasks=Task.annotate_urgency(tasks))
+    
+    key = response_cache.key(current_user.id, 'dashboard_tasks', request.query_string)
+    try:
+        return response_cache.get_or_set(key, render_tasks)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
 
 # ============================================================================
@@ -301,10 +598,13 @@ def dashboard():
 
 @app.route('/courses')
 @login_required
+@read_only
 def courses():
     """Course management page"""
-    all_courses = Course.query.filter_by(user_id=current_user.id).all()
-    return render_template('courses.html', courses=all_courses)
+    course_counts = Course.with_task_counts(current_user.id)
+    all_courses = [course for course, task_count in course_counts]
+    task_counts = {course.id: task_count for course, task_count in course_counts}
+    return render_template('courses.html', courses=all_courses, task_counts=task_counts)
 
 
 @app.route('/courses', methods=['POST'])
@@ -348,11 +648,16 @@ def delete_course(course_id):
 
 @app.route('/tasks')
 @login_required
+@read_only
 def tasks():
     """Task management page"""
-    all_tasks = Task.query.join(Course).filter(Course.user_id == current_user.id).order_by(Task.due_date).all()
+    def render_tasks():
+        all_tasks = user_tasks_query(current_user.id).order_by(Task.due_date).all()
+        return render_template('_task_list.html', tasks=Task.annotate_urgency(all_tasks))
+    
+    tasks_html = Markup(response_cache.get_or_set(response_cache.key(current_user.id, 'tasks'), render_tasks))
     all_courses = Course.query.filter_by(user_id=current_user.id).all()
-    return render_template('tasks.html', tasks=all_tasks, courses=all_courses)
+    return render_template('tasks.html', tasks_html=tasks_html, courses=all_courses)
 
 
 @app.route('/tasks', methods=['POST'])
@@ -387,7 +692,8 @@ def add_task():
             task_type=task_type,
             status=status,
             priority=priority,
-            course_id=int(course_id)
+            course_id=course.id,
+            user_id=current_user.id
         )
         
         db.session.add(task)
@@ -399,15 +705,53 @@ def add_task():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/tasks/import', methods=['POST'])
+@login_required
+def import_tasks():
+    """Bulk import tasks from a JSON body or an uploaded .json, .csv or .ics file
+    
+    Fields missing from a row (course_id, task_type, status, priority) fall back
+    to form fields or query parameters of the same name; .ics entries default
+    to the assignment type. Valid rows are inserted even when others fail;
+    failures are reported per row.
+    """
+    try:
+        defaults = {
+            name: request.form.get(name) or request.args.get(name)
+            for name in ('course_id', 'task_type', 'status', 'priority')
+        }
+        
+        upload = request.files.get('file')
+        if upload is not None:
+            extension = upload.filename.rsplit('.', 1)[-1].lower() if '.' in upload.filename else ''
+            parser = task_import.PARSERS.get(extension)
+            if parser is None:
+                return jsonify({'error': 'File must be .json, .csv or .ics'}), 400
+            rows = parser(upload.read().decode('utf-8-sig'))
+            if extension == 'ics':
+                defaults['task_type'] = defaults['task_type'] or 'assignment'
+        elif request.is_json:
+            rows = task_import.parse_json(request.get_data(as_text=True))
+        else:
+            return jsonify({'error': 'Send a JSON body or upload a file'}), 400
+        
+        tasks, errors = task_import.validate_rows(rows, current_user.id, defaults)
+        imported = task_import.insert_tasks(tasks)
+        
+        return jsonify({'imported': imported, 'errors': errors}), 200 if imported or not errors else 400
+    except (task_import.ImportFormatError, UnicodeDecodeError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/tasks/<int:task_id>', methods=['PUT'])
 @login_required
 def update_task(task_id):
     """Update task status and priority only"""
     try:
-        task = Task.query.join(Course).filter(
-            Task.id == task_id,
-            Course.user_id == current_user.id
-        ).first_or_404()
+        task = user_tasks_query(current_user.id).filter(Task.id == task_id).first_or_404()
         
         data = request.get_json()
         
@@ -425,6 +769,71 @@ def update_task(task_id):
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/tasks/batch', methods=['PUT'])
+@login_required
+def batch_update_tasks():
+    """Update status and/or priority of many tasks in one statement
+    
+    Body: [{"id": 1, "status": "completed"}, {"id": 2, "priority": "high"}, ...]
+    (or {"changes": [...]}). Ids the user does not own are reported as not_found.
+    """
+    try:
+        data = request.get_json(silent=True)
+        changes = data.get('changes') if isinstance(data, dict) else data
+        if not isinstance(changes, list):
+            return jsonify({'error': 'Body must be a list of changes'}), 400
+        
+        statuses = {}
+        priorities = {}
+        errors = []
+        for index, change in enumerate(changes):
+            if not isinstance(change, dict) or type(change.get('id')) is not int:
+                errors.append({'index': index, 'error': 'Each change needs an integer id'})
+            elif 'status' not in change and 'priority' not in change:
+                errors.append({'index': index, 'error': 'Change needs a status or priority'})
+            elif change.get('status', TASK_STATUSES[0]) not in TASK_STATUSES:
+                errors.append({'index': index, 'error': f"Invalid status {change['status']!r}"})
+            elif change.get('priority', TASK_PRIORITIES[0]) not in TASK_PRIORITIES:
+                errors.append({'index': index, 'error': f"Invalid priority {change['priority']!r}"})
+            else:
+                if 'status' in change:
+                    statuses[change['id']] = change['status']
+                if 'priority' in change:
+                    priorities[change['id']] = change['priority']
+        if errors:
+            return jsonify({'error': 'Invalid changes', 'errors': errors}), 400
+        
+        # Check ownership of every requested task with one query
+        requested = set(statuses) | set(priorities)
+        owned = {task_id for (task_id,) in db.session.query(Task.id).join(Course).filter(
+            Task.id.in_(requested),
+            Course.user_id == current_user.id
+        )} if requested else set()
+        
+        # One UPDATE ... WHERE id IN (...) with a CASE per column picks each row's new value
+        values = {}
+        owned_statuses = {task_id: status for task_id, status in statuses.items() if task_id in owned}
+        owned_priorities = {task_id: priority for task_id, priority in priorities.items() if task_id in owned}
+        if owned_statuses:
+            values['status'] = case(owned_statuses, value=Task.id, else_=Task.status)
+        if owned_priorities:
+            values['priority'] = case(owned_priorities, value=Task.id, else_=Task.priority)
+        if owned:
+            db.session.execute(
+                update(Task).where(Task.id.in_(owned)).values(values),
+                execution_options={'synchronize_session': False}
+            )
+            db.session.commit()
+        
+        return jsonify({
+            'updated': sorted(owned),
+            'not_found': sorted(requested - owned)
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/tasks/<int:task_id>', methods=['DELETE'])
 @login_required
 def delete_task(task_id):
@@ -449,18 +858,91 @@ def delete_task(task_id):
 
 @app.route('/api/tasks')
 @login_required
+@read_only
 def api_get_tasks():
-    """Get all tasks as JSON"""
-    tasks = Task.query.join(Course).filter(Course.user_id == current_user.id).order_by(Task.due_date).all()
-    return jsonify([task.to_dict() for task in tasks])
+    """Get one page of tasks as JSON, ordered by due date
+    
+    Query parameters:
+        limit: page size (default 100, max 500)
+        cursor: next_cursor value from the previous page
+        task_type, status, priority, course_id: exact-match filters
+        due_after, due_before: inclusive YYYY-MM-DD bounds on the due date
+    """
+    def build_page():
+        limit = min(max(int(request.args.get('limit', TASKS_PAGE_SIZE)), 1), TASKS_MAX_PAGE_SIZE)
+        query = filter_tasks_query(user_tasks_query(current_user.id), request.args)
+        
+        cursor = request.args.get('cursor')
+        if cursor:
+            due_date, task_id = decode_task_cursor(cursor)
+            query = query.filter(tuple_(Task.due_date, Task.id) > tuple_(due_date, task_id))
+        
+        # Fetch one extra row to learn whether another page exists
+        tasks = query.order_by(Task.due_date, Task.id).limit(limit + 1).all()
+        next_cursor = encode_task_cursor(tasks[limit - 1]) if len(tasks) > limit else None
+        today = current_date()
+        
+        return app.json.dumps({
+            'tasks': [task.to_dict(today) for task in tasks[:limit]],
+            'next_cursor': next_cursor
+        })
+    
+    return conditional_json_response('api_tasks', build_page)
 
 
 @app.route('/api/courses')
 @login_required
+@read_only
 def api_get_courses():
     """Get all courses as JSON"""
-    courses = Course.query.filter_by(user_id=current_user.id).all()
-    return jsonify([course.to_dict() for course in courses])
+    def build_courses():
+        course_counts = Course.with_task_counts(current_user.id)
+        return app.json.dumps([course.to_dict(task_count=task_count) for course, task_count in course_counts])
+    
+    return conditional_json_response('api_courses', build_courses)
+
+
+@app.route('/api/export')
+@login_required
+def api_export():
+    """Stream all of the user's data as NDJSON (courses and tasks) or CSV (tasks)"""
+    export_format = request.args.get('format', 'ndjson')
+    if export_format == 'ndjson':
+        rows, mimetype = export.iter_ndjson(current_user.id), 'application/x-ndjson'
+    elif export_format == 'csv':
+        rows, mimetype = export.iter_csv(current_user.id), 'text/csv'
+    else:
+        return jsonify({'error': 'format must be ndjson or csv'}), 400
+    
+    filename = f'student-organizer-export.{export_format}'
+    return Response(
+        stream_with_context(export.iter_chunks(rows)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+
+def can_read_metrics():
+    """Whether the request carries the metrics token or comes from an admin user"""
+    token = app.config['METRICS_TOKEN']
+    authorization = request.headers.get('Authorization', '')
+    if token and authorization.startswith('Bearer '):
+        return hmac.compare_digest(authorization[len('Bearer '):].encode(), token.encode())
+    return current_user.is_authenticated and current_user.username in app.config['ADMIN_USERNAMES']
+
+
+@app.route('/api/metrics')
+def api_get_metrics():
+    """Get operational metrics as JSON (admins and the metrics token only)"""
+    if not can_read_metrics():
+        return jsonify({'error': 'Forbidden'}), 403
+    return jsonify({
+        'email_queue': email_queue.stats(),
+        'response_cache': response_cache.stats(),
+        'user_cache': user_cache.stats(),
+        'rate_limiter': rate_limiter.stats(),
+        'scheduler': scheduler.stats()
+    })
 
 
 # ============================================================================
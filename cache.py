@@ -0,0 +1,238 @@
+"""
+Caches for Student Life Organizer
+Rendered fragments and JSON payloads are cached under a per-user version key
+that is bumped whenever the user's courses or tasks change, and the logged-in
+user is cached between requests
+"""
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy.orm import make_transient_to_detached
+from models import db, User, current_date
+from routing import primary_reads
+import revisions
+
+# Versions outlive cached entries so that entries always expire first
+VERSION_TTL = 24 * 60 * 60
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache whose entries expire after `ttl` seconds"""
+
+    def __init__(self, max_entries=1024, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + (ttl or self.ttl))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class RedisCache:
+    """Cache backend for a Redis-compatible server, shared by all workers"""
+
+    def __init__(self, url, ttl=300):
+        import redis  # optional dependency, only needed for this backend
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.ttl = ttl
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, value, ex=ttl or self.ttl)
+
+    def delete(self, key):
+        self.client.delete(key)
+
+
+class ResponseCache:
+    """
+    Cache of per-user rendered fragments and JSON payloads
+
+    Configured from the app config:
+        RESPONSE_CACHE_ENABLED: turn caching off entirely
+        RESPONSE_CACHE_BACKEND: 'memory' (default) or 'redis'
+        RESPONSE_CACHE_URL: Redis URL for the redis backend
+        RESPONSE_CACHE_TTL: seconds an entry lives
+        RESPONSE_CACHE_SIZE: max entries in the memory backend
+
+    Keys embed the user's current version, which is bumped after every
+    commit that touches that user's courses or tasks, and
+    today's date, because days remaining change at midnight.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.enabled = False
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+        self._stats_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('RESPONSE_CACHE_ENABLED', True)
+        ttl = app.config.get('RESPONSE_CACHE_TTL', 300)
+        if app.config.get('RESPONSE_CACHE_BACKEND', 'memory') == 'redis':
+            self.backend = RedisCache(app.config['RESPONSE_CACHE_URL'], ttl=ttl)
+        else:
+            self.backend = LRUCache(app.config.get('RESPONSE_CACHE_SIZE', 1024), ttl=ttl)
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def version(self, user_id):
+        """
+        Current cache version of a user's data
+        
+        Versions are fresh time-based tokens rather than counters, so a
+        version that expired or was evicted never comes back with an old
+        value and cannot revive a stale entry or ETag.
+        """
+        version = self.backend.get(f'version:{user_id}')
+        if version is None:
+            version = self.bump(user_id, count=False)
+        return version
+
+    def bump(self, user_id, count=True):
+        """Invalidate everything cached for a user and return the new version"""
+        version = str(time.time_ns())
+        self.backend.set(f'version:{user_id}', version, ttl=VERSION_TTL)
+        if count:
+            self._count('invalidations')
+        return version
+
+    def key(self, user_id, name, variant=b''):
+        """Build a cache key for one view of a user's data"""
+        if isinstance(variant, bytes):
+            variant = variant.decode('utf-8', 'replace')
+        return f'{name}:{user_id}:{self.version(user_id)}:{current_date().isoformat()}:{variant}'
+
+    def get_or_set(self, key, producer):
+        """
+        Return the cached value for key, calling producer() to fill a miss
+        
+        Fills read from the primary: the key's version is bumped as soon as a
+        write commits, so a fill from a lagging replica would store stale data
+        under the new version until it expires.
+        """
+        if not self.enabled:
+            return producer()
+        value = self.backend.get(key)
+        if value is not None:
+            self._count('hits')
+            return value
+        self._count('misses')
+        with primary_reads():
+            value = producer()
+        self.backend.set(key, value)
+        return value
+
+    def stats(self):
+        """Hit-rate metrics"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else None
+        stats['enabled'] = self.enabled
+        return stats
+
+    def register_invalidation(self):
+        """Bump user versions after every commit that changes their data (see revisions.py)"""
+        revisions.on_commit(self._bump_users)
+
+    def _bump_users(self, user_ids):
+        for user_id in user_ids:
+            self.bump(user_id)
+
+
+class UserCache:
+    """
+    In-process cache of the identity columns of logged-in users
+
+    Configured from the app config:
+        USER_CACHE_TTL: seconds a cached user is trusted (0 disables the cache)
+        USER_CACHE_SIZE: max users kept
+
+    Only plain column values are cached, never ORM objects, so entries can be
+    shared between threads. Columns outside USER_CACHE_COLUMNS, such as
+    password_hash, are loaded from the database on first access. Invalidation
+    is local to the process; other workers pick changes up after the TTL.
+    """
+
+    USER_CACHE_COLUMNS = (
+        'id', 'username', 'email', 'email_notifications_enabled',
+        'timezone', 'notification_hour', 'reminder_rules'
+    )
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.enabled = False
+        self._stats = {'hits': 0, 'misses': 0}
+        self._stats_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        ttl = app.config.get('USER_CACHE_TTL', 60)
+        self.enabled = ttl > 0
+        self.backend = LRUCache(app.config.get('USER_CACHE_SIZE', 1024), ttl=ttl)
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def load(self, user_id):
+        """
+        Return the User for user_id, from the cache when possible
+
+        A cached user is rebuilt as a detached instance and merged into the
+        session without a SELECT, so it behaves like a normally loaded user.
+        """
+        snapshot = self.backend.get(user_id) if self.enabled else None
+        if snapshot is None:
+            self._count('misses')
+            user = db.session.get(User, user_id)
+            if user is not None and self.enabled:
+                self.backend.set(user_id, {name: getattr(user, name) for name in self.USER_CACHE_COLUMNS})
+            return user
+
+        self._count('hits')
+        user = User(**snapshot)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
+    def invalidate(self, user_id):
+        """Forget a cached user after their profile changed or they logged out"""
+        self.backend.delete(user_id)
+
+    def stats(self):
+        """Hit-rate metrics"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else None
+        stats['enabled'] = self.enabled
+        return stats
@@ -1,14 +1,172 @@
 """
 Database initialization for Student Life Organizer
 """
-from models import db
+from sqlalchemy import delete, event, exists, inspect, select, text, update
+from sqlalchemy.engine import make_url
+from models import db, Course, SentReminder, Task
+from routing import replica_binds
 
 
 def init_db(app):
     """Initialize the database with the Flask app"""
+    configure_engine(app)
     db.init_app(app)
     
     with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'connect', sqlite_pragma_listener(app.config))
+        
         # Create all tables
         db.create_all()
+        upgrade_schema()
         print("Database initialized successfully")
+
+
+# Values for columns derived from other tables, filled in when the column is
+# added to a database that already has rows
+BACKFILLS = {
+    ('tasks', 'user_id'): lambda: update(Task).values(
+        user_id=select(Course.user_id).where(Course.id == Task.course_id).scalar_subquery()
+    ),
+}
+
+
+def upgrade_schema():
+    """
+    Bring an existing database file up to date with the models
+    
+    create_all() skips tables that already exist, including their columns
+    and indexes, so columns and indexes added to the models later are
+    created here.
+    """
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in columns:
+                add_column(table, column)
+                backfill = BACKFILLS.get((table.name, column.name))
+                if backfill is not None:
+                    with db.engine.begin() as connection:
+                        connection.execute(backfill())
+                print(f"Added column {table.name}.{column.name}")
+        
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=db.engine)
+                print(f"Created index {index.name}")
+    
+    if db.engine.dialect.name == 'sqlite':
+        migrate_sqlite()
+
+
+# PRAGMA user_version of a SQLite file that has had every one-off migration
+SQLITE_SCHEMA_VERSION = 1
+
+
+def migrate_sqlite():
+    """
+    Run the one-off data migrations a SQLite file has not had yet
+    
+    The file's PRAGMA user_version records the last migration applied, so
+    each runs once per database rather than on every startup.
+    """
+    with db.engine.begin() as connection:
+        version = connection.exec_driver_sql('PRAGMA user_version').scalar()
+        if version >= SQLITE_SCHEMA_VERSION:
+            return
+        if version < 1:
+            # Ledger rows of tasks deleted while SQLite ignored ON DELETE
+            # CASCADE (foreign_keys is now on); a new task reusing the id
+            # would otherwise have its reminder suppressed
+            removed = connection.execute(
+                delete(SentReminder).where(~exists().where(Task.id == SentReminder.task_id))
+            ).rowcount
+            if removed:
+                print(f"Removed {removed} reminder ledger rows of deleted tasks")
+        connection.exec_driver_sql(f'PRAGMA user_version = {SQLITE_SCHEMA_VERSION}')
+
+
+def add_column(table, column):
+    """
+    Add a model column to an existing table
+    
+    Columns with a constant default are added NOT NULL with that default.
+    Columns with a callable default (such as a timestamp) are added as
+    nullable, because ALTER TABLE cannot add them as NOT NULL, and the
+    existing rows are backfilled with one computed value.
+    """
+    dialect = db.engine.dialect
+    ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=dialect)}'
+    default = column.default
+    with db.engine.begin() as connection:
+        if default is not None and default.is_scalar:
+            literal = column.type.literal_processor(dialect)(default.arg)
+            not_null = '' if column.nullable else ' NOT NULL'
+            connection.execute(text(f'{ddl}{not_null} DEFAULT {literal}'))
+        else:
+            connection.execute(text(ddl))
+            if default is not None and default.is_callable:
+                connection.execute(table.update().values({column.name: default.arg(None)}))
+
+
+def configure_engine(app):
+    """
+    Set up the primary/replica binds and pool policy before engines are created
+    
+    DATABASE_REPLICA_URLS adds one replica_<n> bind per URI; read-only views
+    are routed to them by routing.RoutingSession. File and server databases
+    get a bounded QueuePool sized by SQLALCHEMY_POOL_SIZE and
+    SQLALCHEMY_MAX_OVERFLOW; in-memory SQLite keeps SQLAlchemy's own pool.
+    """
+    replica_urls = app.config.get('DATABASE_REPLICA_URLS') or []
+    if replica_urls:
+        binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+        binds.update(replica_binds(replica_urls))
+    
+    urls = [app.config['SQLALCHEMY_DATABASE_URI'], *replica_urls]
+    if any(_is_memory_sqlite(make_url(url)) for url in urls):
+        return
+    
+    options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+    options.setdefault('pool_size', app.config.get('SQLALCHEMY_POOL_SIZE', 5))
+    options.setdefault('max_overflow', app.config.get('SQLALCHEMY_MAX_OVERFLOW', 10))
+    options.setdefault('pool_timeout', app.config.get('SQLALCHEMY_POOL_TIMEOUT', 30))
+    options.setdefault('pool_pre_ping', True)
+
+
+def _is_memory_sqlite(url):
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def sqlite_pragma_listener(config):
+    """
+    Build a connect listener that tunes every new SQLite connection
+    
+    WAL lets readers run while a writer commits, synchronous=NORMAL is safe
+    under WAL and skips an fsync per commit, and busy_timeout makes a blocked
+    writer wait instead of failing with "database is locked". foreign_keys
+    enforces the models' ON DELETE CASCADE, which tables such as
+    sent_reminders rely on instead of an ORM relationship.
+    """
+    pragmas = [
+        ('journal_mode', config.get('SQLITE_JOURNAL_MODE', 'WAL')),
+        ('synchronous', config.get('SQLITE_SYNCHRONOUS', 'NORMAL')),
+        ('busy_timeout', int(config.get('SQLITE_BUSY_TIMEOUT_MS', 5000))),
+        ('cache_size', -int(config.get('SQLITE_CACHE_SIZE_KB', 65536))),
+        ('mmap_size', int(config.get('SQLITE_MMAP_SIZE', 268435456))),
+        ('temp_store', 'MEMORY'),
+        ('foreign_keys', 'ON'),
+    ]
+    
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+    
+    return set_pragmas
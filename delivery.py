@@ -0,0 +1,396 @@
+"""
+Pooled SMTP delivery for Student Life Organizer
+Sends many reminder emails over a small pool of long-lived SMTP connections,
+either from worker threads or from an asyncio event loop
+"""
+import asyncio
+import queue
+import smtplib
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from contextlib import contextmanager
+from flask import current_app
+from flask_mail import BadHeaderError, email_dispatched, sanitize_address, sanitize_addresses
+
+
+class SMTPConnectionPool:
+    """
+    Bounded pool of long-lived Flask-Mail connections
+
+    At most `size` connections are open at once. A connection is retired after
+    `max_messages` messages or as soon as it fails, and a fresh one is opened
+    on the next checkout.
+    """
+
+    def __init__(self, mail, size=2, max_messages=100):
+        self.mail = mail
+        self.size = size
+        self.max_messages = max_messages
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _open(self):
+        """Open and authenticate a new SMTP connection"""
+        connection = self.mail.connect()
+        connection.__enter__()
+        connection.pool_sent = 0
+        return connection
+
+    @staticmethod
+    def _close(connection):
+        """Close a connection, ignoring errors from an already dead socket"""
+        try:
+            connection.__exit__(None, None, None)
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection; it is discarded if the block raises"""
+        self._slots.acquire()
+        connection = None
+        try:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                connection = self._open()
+            yield connection
+        except Exception:
+            if connection is not None:
+                self._close(connection)
+                connection = None
+            raise
+        finally:
+            if connection is not None:
+                if connection.pool_sent >= self.max_messages:
+                    self._close(connection)
+                else:
+                    self._idle.put(connection)
+            self._slots.release()
+
+    def close(self):
+        """Close every idle connection"""
+        while True:
+            try:
+                self._close(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+
+class MailDelivery:
+    """
+    Deliver messages through an SMTPConnectionPool using worker threads
+
+    Configured from the app config:
+        MAIL_POOL_SIZE: number of SMTP connections kept open
+        MAIL_POOL_MAX_MESSAGES: messages sent on a connection before it is recycled
+        MAIL_DELIVERY_WORKERS: number of sending threads
+    """
+
+    def __init__(self, mail, pool_size=2, max_messages=100, workers=2):
+        self.pool = SMTPConnectionPool(mail, size=pool_size, max_messages=max_messages)
+        self.workers = workers
+
+    @classmethod
+    def from_config(cls, mail, config):
+        """Build a delivery subsystem from a Flask config mapping"""
+        return cls(
+            mail,
+            pool_size=config.get('MAIL_POOL_SIZE', 2),
+            max_messages=config.get('MAIL_POOL_MAX_MESSAGES', 100),
+            workers=config.get('MAIL_DELIVERY_WORKERS', 2)
+        )
+
+    def send(self, message):
+        """
+        Send one message on a pooled connection
+
+        A dropped or broken connection is replaced and the message retried once.
+        Errors reported by the server for this message are not retried.
+        Returns None on success or the exception that prevented delivery.
+        """
+        for attempt in range(2):
+            try:
+                with self.pool.connection() as connection:
+                    try:
+                        connection.send(message)
+                    except smtplib.SMTPResponseException as e:
+                        # The server rejected this message; the session is still usable
+                        return e
+                    except smtplib.SMTPRecipientsRefused as e:
+                        return e
+                    connection.pool_sent += 1
+                return None
+            except Exception as e:
+                error = e
+        return error
+
+    def send_many(self, messages, on_result=None):
+        """
+        Send an iterable of messages across the worker threads
+
+        `messages` is consumed lazily in the calling thread, so it may be a
+        generator backed by a database query. `on_result(message, error)` is
+        called from the worker threads after each attempt; an exception it
+        raises is logged and does not stop the worker.
+        Returns a (sent, failed) tuple of counts.
+        """
+        app = current_app._get_current_object()
+        pending = queue.Queue(maxsize=self.workers * 4)
+        counts = {'sent': 0, 'failed': 0}
+        counts_lock = threading.Lock()
+        done = object()
+
+        def worker():
+            with app.app_context():
+                while True:
+                    message = pending.get()
+                    if message is done:
+                        break
+                    try:
+                        error = self.send(message)
+                        with counts_lock:
+                            counts['failed' if error else 'sent'] += 1
+                        if on_result is not None:
+                            on_result(message, error)
+                    except Exception as e:
+                        # Keep draining the queue, or the producer blocks forever on put()
+                        print(f"✗ Error in mail delivery worker: {str(e)}")
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        try:
+            for message in messages:
+                pending.put(message)
+        finally:
+            for _ in threads:
+                pending.put(done)
+            for thread in threads:
+                thread.join()
+
+        return counts['sent'], counts['failed']
+
+    def close(self):
+        """Close all pooled connections"""
+        self.pool.close()
+
+
+class AsyncMailDelivery:
+    """
+    Deliver messages over many concurrent SMTP sessions on an asyncio event loop
+
+    Configured from the app config:
+        MAIL_ASYNC_CONCURRENCY: SMTP sessions open at once
+        MAIL_POOL_MAX_MESSAGES: messages sent on a session before it is recycled
+
+    Needs the optional aiosmtplib package. The event loop runs in its own
+    thread, so send() and send_many() block like MailDelivery's and the two
+    are interchangeable. A session costs a socket rather than a thread, so
+    concurrency can be far higher than MAIL_DELIVERY_WORKERS.
+    """
+
+    def __init__(self, mail, concurrency=20, max_messages=100):
+        import aiosmtplib  # optional dependency, only needed for this transport
+        self.aiosmtplib = aiosmtplib
+        self.mail = mail
+        self.concurrency = concurrency
+        self.max_messages = max_messages
+        self._loop = None
+        self._thread = None
+        self._loop_lock = threading.Lock()
+        self._sessions = None
+        self._idle = []
+
+    @classmethod
+    def from_config(cls, mail, config):
+        """Build a delivery subsystem from a Flask config mapping"""
+        return cls(
+            mail,
+            concurrency=config.get('MAIL_ASYNC_CONCURRENCY', 20),
+            max_messages=config.get('MAIL_POOL_MAX_MESSAGES', 100)
+        )
+
+    # ------------------------------------------------------------------
+    # Event loop thread
+    # ------------------------------------------------------------------
+
+    def _ensure_loop(self):
+        """Start the event loop thread on first use (or after close)"""
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name='mail-async', daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def _submit(self, message):
+        """
+        Serialize a message in the calling thread and schedule its delivery
+
+        Flask-Mail needs the app context to render a message, which the loop
+        thread does not have. Returns a concurrent.futures.Future of the
+        delivery result.
+        """
+        assert message.send_to, "No recipients have been added"
+        assert message.sender, "The message does not specify a sender"
+        if message.has_bad_headers():
+            raise BadHeaderError
+        if message.date is None:
+            message.date = time.time()
+        envelope = (
+            sanitize_address(message.sender),
+            list(sanitize_addresses(message.send_to)),
+            message.as_bytes()
+        )
+        return asyncio.run_coroutine_threadsafe(self._deliver(*envelope), self._ensure_loop())
+
+    # ------------------------------------------------------------------
+    # Coroutines, all run on the loop thread
+    # ------------------------------------------------------------------
+
+    async def _open(self):
+        """Open and authenticate a new SMTP session"""
+        state = self.mail.state
+        session = self.aiosmtplib.SMTP(
+            hostname=state.server,
+            port=state.port,
+            use_tls=state.use_ssl,
+            start_tls=state.use_tls
+        )
+        await session.connect()
+        if state.username and state.password:
+            await session.login(state.username, state.password)
+        session.pool_sent = 0
+        return session
+
+    async def _close(self, session):
+        """Close a session, ignoring errors from an already dead socket"""
+        try:
+            await session.quit()
+        except Exception:
+            session.close()
+
+    async def _checkin(self, session):
+        """Return a session to the idle list, or retire it once used up"""
+        if session.pool_sent >= self.max_messages:
+            await self._close(session)
+        else:
+            self._idle.append(session)
+
+    async def _deliver(self, sender, recipients, payload):
+        """
+        Send one message on an idle or new session
+
+        Same contract as MailDelivery.send: a broken session is replaced and
+        the message retried once, a rejection by the server is returned
+        without retrying, and None means success.
+        """
+        if self.mail.state.suppress:
+            return None
+        if self._sessions is None:
+            self._sessions = asyncio.Semaphore(self.concurrency)
+        aiosmtplib = self.aiosmtplib
+        async with self._sessions:
+            for attempt in range(2):
+                session = self._idle.pop() if self._idle else None
+                try:
+                    if session is None:
+                        session = await self._open()
+                    try:
+                        await session.sendmail(sender, recipients, payload)
+                    except (aiosmtplib.SMTPResponseException, aiosmtplib.SMTPRecipientsRefused) as e:
+                        # The server rejected this message; the session is still usable
+                        await self._checkin(session)
+                        return e
+                    session.pool_sent += 1
+                    await self._checkin(session)
+                    return None
+                except Exception as e:
+                    if session is not None:
+                        session.close()
+                    error = e
+            return error
+
+    async def _close_idle(self):
+        while self._idle:
+            await self._close(self._idle.pop())
+
+    # ------------------------------------------------------------------
+    # MailDelivery interface
+    # ------------------------------------------------------------------
+
+    def send(self, message):
+        """Send one message; returns None on success or the exception that prevented delivery"""
+        try:
+            error = self._submit(message).result()
+        except Exception as e:
+            error = e
+        if error is None:
+            email_dispatched.send(message, app=current_app._get_current_object())
+        return error
+
+    def send_many(self, messages, on_result=None):
+        """
+        Send an iterable of messages concurrently on the event loop
+
+        `messages` is consumed lazily in the calling thread and at most twice
+        MAIL_ASYNC_CONCURRENCY messages are in flight, so a generator backed
+        by a database query is read only as fast as the server accepts mail.
+        `on_result(message, error)` is called from the calling thread as
+        each delivery finishes; an exception it raises is logged and does not
+        stop the run, as with MailDelivery.
+        Returns a (sent, failed) tuple of counts.
+        """
+        app = current_app._get_current_object()
+        pending = {}
+        counts = {'sent': 0, 'failed': 0}
+
+        def report(message, error):
+            counts['failed' if error else 'sent'] += 1
+            try:
+                if error is None:
+                    email_dispatched.send(message, app=app)
+                if on_result is not None:
+                    on_result(message, error)
+            except Exception as e:
+                # Keep going, or the results of messages still in flight are lost
+                print(f"✗ Error in mail delivery result handler: {str(e)}")
+
+        def collect(futures):
+            for future in futures:
+                report(pending.pop(future), future.exception() or future.result())
+
+        try:
+            for message in messages:
+                if len(pending) >= self.concurrency * 2:
+                    collect(wait(pending, return_when=FIRST_COMPLETED).done)
+                try:
+                    pending[self._submit(message)] = message
+                except Exception as e:
+                    report(message, e)
+        finally:
+            collect(wait(pending).done)
+
+        return counts['sent'], counts['failed']
+
+    def close(self):
+        """Close all idle sessions and stop the event loop thread"""
+        with self._loop_lock:
+            loop, self._loop = self._loop, None
+            if loop is None:
+                return
+            asyncio.run_coroutine_threadsafe(self._close_idle(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            self._thread.join()
+            loop.close()
+            self._thread = None
+            self._sessions = None
+
+
+def create_delivery(mail, config):
+    """Build the delivery subsystem selected by MAIL_TRANSPORT ('pool' or 'async')"""
+    if config.get('MAIL_TRANSPORT', 'pool') == 'async':
+        return AsyncMailDelivery.from_config(mail, config)
+    return MailDelivery.from_config(mail, config)
@@ -0,0 +1,205 @@
+"""
+Durable outbound email queue for Student Life Organizer
+Emails are journaled in the outbound_emails table and drained by a fixed pool of worker threads
+"""
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from flask_mail import Message
+from sqlalchemy import func, or_
+from sqlalchemy.exc import IntegrityError
+from models import db, OutboundEmail
+
+
+class EmailQueue:
+    """
+    Persistent outbound queue with retries, backoff and dedup keys
+
+    Configured from the app config:
+        EMAIL_QUEUE_WORKERS: number of worker threads draining the queue
+        EMAIL_QUEUE_MAX_ATTEMPTS: attempts before a message is marked failed
+        EMAIL_QUEUE_BACKOFF_SECONDS: base delay, doubled after every failed attempt
+        EMAIL_QUEUE_POLL_SECONDS: idle wait between polls of the journal
+        EMAIL_QUEUE_LEASE_SECONDS: how long a claimed message stays locked;
+            messages left in 'sending' by a dead worker are retried after this
+    """
+
+    def __init__(self, app=None, delivery=None):
+        self.app = None
+        self.delivery = None
+        self._threads = []
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._latencies = deque(maxlen=1000)
+        self._counters = {'sent': 0, 'retried': 0, 'failed': 0}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, delivery)
+
+    def init_app(self, app, delivery):
+        """Bind the queue to an app and the MailDelivery used to send"""
+        self.app = app
+        self.delivery = delivery
+        self.workers = app.config.get('EMAIL_QUEUE_WORKERS', 1)
+        self.max_attempts = app.config.get('EMAIL_QUEUE_MAX_ATTEMPTS', 5)
+        self.backoff_seconds = app.config.get('EMAIL_QUEUE_BACKOFF_SECONDS', 30)
+        self.poll_seconds = app.config.get('EMAIL_QUEUE_POLL_SECONDS', 5)
+        self.lease_seconds = app.config.get('EMAIL_QUEUE_LEASE_SECONDS', 300)
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+
+    def enqueue(self, message, dedup_key):
+        """
+        Journal a Flask-Mail Message for delivery
+
+        Returns False without queueing anything if a message with the same
+        dedup_key has already been queued.
+        """
+        email = OutboundEmail(
+            dedup_key=dedup_key,
+            sender=message.sender,
+            recipient=message.recipients[0],
+            subject=message.subject,
+            text_body=message.body,
+            html_body=message.html
+        )
+        try:
+            db.session.add(email)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return False
+        self._wakeup.set()
+        return True
+
+    def stats(self):
+        """Queue depth, age of the oldest waiting message and recent delivery latency"""
+        now = datetime.utcnow()
+        depth = dict(
+            db.session.query(OutboundEmail.status, func.count(OutboundEmail.id))
+            .filter(OutboundEmail.status.in_(['pending', 'sending', 'failed']))
+            .group_by(OutboundEmail.status)
+            .all()
+        )
+        oldest = db.session.query(func.min(OutboundEmail.created_at)).filter(
+            OutboundEmail.status.in_(['pending', 'sending'])
+        ).scalar()
+        with self._lock:
+            latencies = sorted(self._latencies)
+            counters = dict(self._counters)
+        return {
+            'pending': depth.get('pending', 0),
+            'sending': depth.get('sending', 0),
+            'failed': depth.get('failed', 0),
+            'oldest_pending_seconds': (now - oldest).total_seconds() if oldest else 0,
+            'latency_avg_seconds': sum(latencies) / len(latencies) if latencies else None,
+            'latency_p95_seconds': latencies[int(len(latencies) * 0.95)] if latencies else None,
+            'workers': len(self._threads),
+            **counters
+        }
+
+    # ------------------------------------------------------------------
+    # Worker side
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Start the fixed-size worker pool"""
+        if self._threads:
+            return
+        self._stopping.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'email-queue-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        """Ask the workers to finish their current message and exit"""
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _run(self):
+        with self.app.app_context():
+            while not self._stopping.is_set():
+                try:
+                    worked = self.process_next()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"✗ Email queue worker error: {str(e)}")
+                    worked = False
+                finally:
+                    db.session.remove()
+                if not worked:
+                    self._wakeup.wait(self.poll_seconds)
+                    self._wakeup.clear()
+
+    def _claim(self):
+        """Lock the next due message for this worker, or return None"""
+        now = datetime.utcnow()
+        claimable = or_(
+            (OutboundEmail.status == 'pending') & (OutboundEmail.next_attempt_at <= now),
+            (OutboundEmail.status == 'sending') & (OutboundEmail.locked_until < now)
+        )
+        candidates = db.session.query(OutboundEmail.id).filter(claimable).order_by(
+            OutboundEmail.next_attempt_at
+        ).limit(10).all()
+        for (email_id,) in candidates:
+            claimed = OutboundEmail.query.filter(OutboundEmail.id == email_id, claimable).update({
+                'status': 'sending',
+                'locked_until': now + timedelta(seconds=self.lease_seconds),
+                'attempts': OutboundEmail.attempts + 1
+            }, synchronize_session=False)
+            db.session.commit()
+            if claimed:
+                return db.session.get(OutboundEmail, email_id)
+        return None
+
+    def process_next(self):
+        """Deliver one message; returns False when nothing was due"""
+        email = self._claim()
+        if email is None:
+            return False
+
+        message = Message(
+            subject=email.subject,
+            sender=email.sender,
+            recipients=[email.recipient],
+            body=email.text_body,
+            html=email.html_body
+        )
+        error = self.delivery.send(message)
+        now = datetime.utcnow()
+        latency = (now - email.created_at).total_seconds()
+
+        if error is None:
+            email.status = 'sent'
+            email.sent_at = now
+            email.locked_until = None
+            email.last_error = None
+            outcome = 'sent'
+            print(f"✓ Email sent successfully to {email.recipient}")
+        elif email.attempts >= self.max_attempts:
+            email.status = 'failed'
+            email.locked_until = None
+            email.last_error = str(error)
+            outcome = 'failed'
+            print(f"✗ Email to {email.recipient} failed permanently: {str(error)}")
+        else:
+            delay = self.backoff_seconds * 2 ** (email.attempts - 1)
+            email.status = 'pending'
+            email.next_attempt_at = now + timedelta(seconds=delay)
+            email.locked_until = None
+            email.last_error = str(error)
+            outcome = 'retried'
+            print(f"✗ Email to {email.recipient} failed, retrying in {delay}s: {str(error)}")
+
+        db.session.commit()
+        with self._lock:
+            self._counters[outcome] += 1
+            if outcome == 'sent':
+                self._latencies.append(latency)
+        return True
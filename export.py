@@ -0,0 +1,74 @@
+"""
+Streaming data export for Student Life Organizer
+Rows are read from a server-side cursor and written out one line at a time
+"""
+import csv
+import json
+from models import db, Course, Task
+
+EXPORT_BATCH_SIZE = 1000
+
+TASK_EXPORT_FIELDS = [
+    'id', 'title', 'description', 'due_date', 'task_type',
+    'status', 'priority', 'course_id', 'course_name'
+]
+
+
+class _LineWriter:
+    """File-like object that hands each csv row back instead of buffering it"""
+    def write(self, value):
+        return value
+
+
+def _course_rows(user_id):
+    """Stream (id, name) for a user's courses"""
+    return db.session.query(Course.id, Course.name).filter(
+        Course.user_id == user_id
+    ).order_by(Course.id).yield_per(EXPORT_BATCH_SIZE)
+
+
+def _task_rows(user_id):
+    """Stream plain task columns for a user's tasks, without building ORM objects"""
+    return db.session.query(
+        Task.id,
+        Task.title,
+        Task.description,
+        Task.due_date,
+        Task.task_type,
+        Task.status,
+        Task.priority,
+        Task.course_id,
+        Course.name
+    ).join(Course, Task.course_id == Course.id).filter(
+        Course.user_id == user_id
+    ).order_by(Task.due_date, Task.id).yield_per(EXPORT_BATCH_SIZE)
+
+
+def iter_ndjson(user_id):
+    """Yield one JSON document per line: the user's courses, then their tasks"""
+    for course_id, name in _course_rows(user_id):
+        yield json.dumps({'type': 'course', 'id': course_id, 'name': name}) + '\n'
+    for row in _task_rows(user_id):
+        record = dict(zip(TASK_EXPORT_FIELDS, row))
+        record['due_date'] = row.due_date.isoformat()
+        yield json.dumps({'type': 'task', **record}) + '\n'
+
+
+def iter_csv(user_id):
+    """Yield a header line and then one CSV line per task"""
+    writer = csv.writer(_LineWriter())
+    yield writer.writerow(TASK_EXPORT_FIELDS)
+    for row in _task_rows(user_id):
+        yield writer.writerow(row)
+
+
+def iter_chunks(lines, lines_per_chunk=EXPORT_BATCH_SIZE):
+    """Join lines into larger chunks so the response is not written a row at a time"""
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= lines_per_chunk:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
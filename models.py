@@ -1,17 +1,79 @@
 """
 Database models for Student Life Organizer
 """
+from flask import g, has_request_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, select
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, date
+from datetime import datetime, date, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from routing import RoutingSession
+from passwords import hasher
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+# Allowed values for the Task choice columns
+TASK_TYPES = ('assignment', 'quiz', 'exam')
+TASK_STATUSES = ('pending', 'in-progress', 'completed')
+TASK_PRIORITIES = ('low', 'medium', 'high')
+
+
+def current_date():
+    """Today's date, fixed for the whole request so one page never straddles midnight"""
+    if not has_request_context():
+        return date.today()
+    if 'today' not in g:
+        g.today = date.today()
+    return g.today
+
+
+def get_timezone(name):
+    """ZoneInfo for an IANA time zone name, falling back to UTC for unknown names"""
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        # Not ZoneInfo('UTC'), which also fails where no time zone data is installed
+        return timezone.utc
+
+
+# Urgency levels, most pressing first, and the last day (from today) of each
+URGENCY_LEVELS = ('overdue', 'urgent', 'soon', 'later')
+URGENT_DAYS = 3
+SOON_DAYS = 7
+
+
+def urgency_for(days):
+    """Urgency level for a task due in `days` days"""
+    if days < 0:
+        return 'overdue'
+    elif days <= URGENT_DAYS:
+        return 'urgent'
+    elif days <= SOON_DAYS:
+        return 'soon'
+    else:
+        return 'later'
+
+
+def urgency_bounds(level, today):
+    """Inclusive (first, last) due dates of an urgency level; None means unbounded"""
+    bounds = {
+        'overdue': (None, today - timedelta(days=1)),
+        'urgent': (today, today + timedelta(days=URGENT_DAYS)),
+        'soon': (today + timedelta(days=URGENT_DAYS + 1), today + timedelta(days=SOON_DAYS)),
+        'later': (today + timedelta(days=SOON_DAYS + 1), None),
+    }
+    if level not in bounds:
+        raise ValueError(f"urgency must be one of: {', '.join(URGENCY_LEVELS)}")
+    return bounds[level]
 
 
 class User(UserMixin, db.Model):
     """User model for authentication"""
     __tablename__ = 'users'
+    __table_args__ = (
+        # Reminder fan-out: which users are due in a given time slot
+        db.Index('ix_users_timezone_notification_hour', 'timezone', 'notification_hour'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -19,23 +81,37 @@ class User(UserMixin, db.Model):
     password_hash = db.Column(db.String(255), nullable=False)
     email_notifications_enabled = db.Column(db.Boolean, default=True, nullable=False)
     
+    # Reminders go out at notification_hour local time in the user's IANA time zone
+    timezone = db.Column(db.String(50), default='UTC', nullable=False)
+    notification_hour = db.Column(db.Integer, default=9, nullable=False)
+    # Comma-separated reminder rules the user wants (see notifications.REMINDER_RULES)
+    reminder_rules = db.Column(db.String(200), default='due_tomorrow', nullable=False)
+    
+    # Bumped whenever any of the user's courses or tasks change (see revisions.py)
+    data_revision = db.Column(db.Integer, default=0, nullable=False)
+    data_updated_at = db.Column(db.DateTime)
+    
     # Relationship: One user has many courses
     courses = db.relationship('Course', backref='user', lazy=True, cascade='all, delete-orphan')
     
     def set_password(self, password):
-        """Hash and set the user's password"""
-        self.password_hash = generate_password_hash(password)
+        """Hash and set the user's password (may raise passwords.HashingBusy)"""
+        self.password_hash = hasher.hash(password)
     
     def check_password(self, password):
-        """Check if provided password matches hash"""
-        return check_password_hash(self.password_hash, password)
+        """Check if provided password matches hash (may raise passwords.HashingBusy)"""
+        return hasher.verify(self.password_hash, password)
+    
+    def local_today(self):
+        """Today's date in the user's time zone"""
+        return datetime.now(get_timezone(self.timezone)).date()
     
     def to_dict(self):
         """Convert user to dictionary"""
         return {
             'id': self.id,
             'username': self.username,
-            'course_count': len(self.courses)
+            'course_count': Course.query.filter_by(user_id=self.id).count()
         }
 
 
@@ -45,23 +121,45 @@ class Course(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationship: One course has many tasks (cascade delete)
     tasks = db.relationship('Task', backref='course', lazy=True, cascade='all, delete-orphan')
     
-    def to_dict(self):
-        """Convert course to dictionary"""
+    @staticmethod
+    def with_task_counts(user_id):
+        """Return (course, task_count) pairs for a user's courses from one grouped COUNT query"""
+        return db.session.query(Course, db.func.count(Task.id)).outerjoin(
+            Task, Task.course_id == Course.id
+        ).filter(Course.user_id == user_id).group_by(Course.id).order_by(Course.id).all()
+    
+    def to_dict(self, task_count=None):
+        """Convert course to dictionary
+        
+        Pass task_count when it was already counted (see with_task_counts);
+        otherwise it is counted in the database without loading the tasks.
+        """
+        if task_count is None:
+            task_count = Task.query.filter_by(course_id=self.id).count()
         return {
             'id': self.id,
             'name': self.name,
-            'task_count': len(self.tasks)
+            'task_count': task_count
         }
 
 
 class Task(db.Model):
     """Task model - represents an assignment, quiz, or exam"""
     __tablename__ = 'tasks'
+    __table_args__ = (
+        # A user's task list: join on course_id, then filter/sort by due_date
+        db.Index('ix_tasks_course_id_due_date', 'course_id', 'due_date'),
+        # Notification digests: tasks due on a given day that are not completed
+        db.Index('ix_tasks_due_date_status', 'due_date', 'status'),
+        # Paged task list: a user's tasks already in (due_date, id) order
+        db.Index('ix_tasks_user_id_due_date_id', 'user_id', 'due_date', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -70,30 +168,83 @@ class Task(db.Model):
     task_type = db.Column(db.String(20), nullable=False)  # assignment, quiz, exam
     status = db.Column(db.String(20), nullable=False, default='pending')  # pending, in-progress, completed
     priority = db.Column(db.String(20), nullable=False, default='medium')  # low, medium, high
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Foreign key to Course (with cascade delete)
     course_id = db.Column(db.Integer, db.ForeignKey('courses.id', ondelete='CASCADE'), nullable=False)
+    # Owner of the course, copied here so one index serves a user's task list
+    # in due-date order across all their courses (set on insert, see below)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     
-    def days_remaining(self):
+    def days_remaining(self, today=None):
         """Calculate days remaining until due date"""
-        today = date.today()
-        delta = self.due_date - today
-        return delta.days
+        return (self.due_date - (today or current_date())).days
     
-    def urgency_level(self):
+    def urgency_level(self, today=None):
         """Determine urgency level based on days remaining"""
-        days = self.days_remaining()
-        if days < 0:
-            return 'overdue'
-        elif days <= 3:
-            return 'urgent'
-        elif days <= 7:
-            return 'soon'
-        else:
-            return 'later'
+        return urgency_for(self.days_remaining(today))
     
-    def to_dict(self):
+    @staticmethod
+    def annotate_urgency(tasks, today=None):
+        """
+        Set days_left and urgency on every task in one pass
+        
+        Templates read these attributes instead of calling days_remaining()
+        and urgency_level() repeatedly per task.
+        """
+        today_ordinal = (today or current_date()).toordinal()
+        for task in tasks:
+            task.days_left = task.due_date.toordinal() - today_ordinal
+            task.urgency = urgency_for(task.days_left)
+        return tasks
+    
+    @staticmethod
+    def urgency_expression(today):
+        """SQL CASE expression classifying due_date into URGENCY_LEVELS"""
+        return db.case(
+            (Task.due_date < today, 'overdue'),
+            (Task.due_date <= today + timedelta(days=URGENT_DAYS), 'urgent'),
+            (Task.due_date <= today + timedelta(days=SOON_DAYS), 'soon'),
+            else_='later'
+        )
+    
+    @staticmethod
+    def summary_counts(user_id, today, task_type=None):
+        """
+        Count a user's tasks per urgency level, course, type and status
+        
+        One GROUP BY query over (urgency, course, type, status) is rolled up
+        in Python. Type counts ignore task_type so the filter can show them
+        all; every other count only includes tasks of task_type when given.
+        """
+        urgency = Task.urgency_expression(today).label('urgency')
+        rows = db.session.query(
+            urgency, Course.id, Course.name, Task.task_type, Task.status, db.func.count(Task.id)
+        ).select_from(Task).join(Course, Task.course_id == Course.id).filter(
+            Course.user_id == user_id
+        ).group_by(urgency, Course.id, Course.name, Task.task_type, Task.status).all()
+        
+        summary = {
+            'total': 0,
+            'urgency': dict.fromkeys(URGENCY_LEVELS, 0),
+            'courses': {},
+            'task_type': dict.fromkeys(TASK_TYPES, 0),
+            'status': dict.fromkeys(TASK_STATUSES, 0),
+        }
+        for level, course_id, course_name, row_type, status, count in rows:
+            summary['task_type'][row_type] = summary['task_type'].get(row_type, 0) + count
+            if task_type and row_type != task_type:
+                continue
+            summary['total'] += count
+            summary['urgency'][level] += count
+            summary['status'][status] = summary['status'].get(status, 0) + count
+            name, course_count = summary['courses'].get(course_id, (course_name, 0))
+            summary['courses'][course_id] = (name, course_count + count)
+        return summary
+    
+    def to_dict(self, today=None):
         """Convert task to dictionary"""
+        days = self.days_remaining(today)
         return {
             'id': self.id,
             'title': self.title,
@@ -104,6 +255,97 @@ class Task(db.Model):
             'priority': self.priority,
             'course_id': self.course_id,
             'course_name': self.course.name,
-            'days_remaining': self.days_remaining(),
-            'urgency_level': self.urgency_level()
+            'days_remaining': days,
+            'urgency_level': urgency_for(days)
+        }
+
+
+@event.listens_for(Task, 'before_insert')
+def set_task_owner(mapper, connection, task):
+    """Copy the course's owner onto a task added without one"""
+    if task.user_id is None:
+        task.user_id = connection.scalar(select(Course.user_id).where(Course.id == task.course_id))
+
+
+class OutboundEmail(db.Model):
+    """Outbound email journal - messages wait here until a queue worker delivers them"""
+    __tablename__ = 'outbound_emails'
+    __table_args__ = (
+        db.Index('ix_outbound_emails_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    dedup_key = db.Column(db.String(200), unique=True, nullable=False)
+    sender = db.Column(db.String(255), nullable=False)
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    text_body = db.Column(db.Text)
+    html_body = db.Column(db.Text)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_until = db.Column(db.DateTime)
+    sent_at = db.Column(db.DateTime)
+
+
+class SentReminder(db.Model):
+    """Ledger of reminders already emailed, so a re-run never sends the same reminder twice"""
+    __tablename__ = 'sent_reminders'
+    __table_args__ = (
+        # Task first: digest queries probe the ledger for each due task
+        db.UniqueConstraint('task_id', 'due_date', 'window', 'user_id', name='uq_sent_reminders_task_window'),
+        # Retention: rows are pruned by due date once no rule can match them
+        db.Index('ix_sent_reminders_due_date', 'due_date'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    task_id = db.Column(db.Integer, db.ForeignKey('tasks.id', ondelete='CASCADE'), nullable=False)
+    window = db.Column(db.String(20), nullable=False)  # which reminder, e.g. 'due_tomorrow'
+    due_date = db.Column(db.Date, nullable=False)  # task due date the reminder was for
+    sent_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class JobLock(db.Model):
+    """Lease on a scheduled job - only the process holding an unexpired lease runs it"""
+    __tablename__ = 'job_locks'
+    
+    name = db.Column(db.String(100), primary_key=True)
+    owner = db.Column(db.String(200), nullable=False)
+    locked_until = db.Column(db.DateTime, nullable=False)
+
+
+class JobRun(db.Model):
+    """One run of a scheduled job, recorded for catch-up and timing"""
+    __tablename__ = 'job_runs'
+    __table_args__ = (
+        # A scheduled slot runs at most once, even if two workers race for it
+        db.UniqueConstraint('job_name', 'scheduled_for', name='uq_job_runs_job_name_scheduled_for'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job_name = db.Column(db.String(100), nullable=False)
+    scheduled_for = db.Column(db.DateTime, nullable=False)  # server local time of the schedule slot
+    owner = db.Column(db.String(200), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='running')  # running, succeeded, failed
+    attempts = db.Column(db.Integer, nullable=False, default=1)
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    duration_seconds = db.Column(db.Float)
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    
+    def to_dict(self):
+        """Convert run to dictionary"""
+        return {
+            'job_name': self.job_name,
+            'scheduled_for': self.scheduled_for.isoformat(),
+            'status': self.status,
+            'attempts': self.attempts,
+            'started_at': self.started_at.isoformat(),
+            'duration_seconds': self.duration_seconds,
+            'result': self.result,
+            'error': self.error
         }
@@ -1,194 +1,376 @@
 """
 Email Notification System for Student Life Organizer
-Sends daily email reminders for tasks due in 1 day
+Sends daily email reminders for overdue and upcoming tasks, according to each
+user's reminder rules
 """
-from flask import render_template_string
+import os
+import threading
+from flask import current_app
 from flask_mail import Message
-from datetime import date, timedelta
-from models import db, User, Task, Course
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from markupsafe import Markup
+from datetime import date, datetime, time, timedelta, timezone
+from itertools import groupby
+from sqlalchemy import and_, delete, insert, or_
+from sqlalchemy.exc import IntegrityError
+from models import db, User, Task, Course, SentReminder, get_timezone
+from delivery import create_delivery
 
+SENDER = 'Student Life Organizer <noreply@studentorganizer.com>'
+EMAIL_TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'email')
 
-def check_and_send_notifications(mail):
+# Reminder rules, in the order they appear in a digest. Each maps the
+# sent_reminders window name to a phrase and the range of days until the due
+# date (relative to the user's local today) that the rule covers.
+OVERDUE_LOOKBACK_DAYS = 7
+REMINDER_RULES = {
+    'overdue': ('overdue', -OVERDUE_LOOKBACK_DAYS, -1),
+    'due_tomorrow': ('due tomorrow', 1, 1),
+    'due_in_3_days': ('due in 3 days', 3, 3),
+    'due_in_1_week': ('due in 1 week', 7, 7),
+}
+DEFAULT_REMINDER_RULE = 'due_tomorrow'
+
+# Day offset -> rule, so matching a task costs one lookup however many rules exist
+_RULE_BY_OFFSET = {
+    offset: name
+    for name, (phrase, first, last) in reversed(REMINDER_RULES.items())
+    for offset in range(first, last + 1)
+}
+_FIRST_OFFSET = min(first for phrase, first, last in REMINDER_RULES.values())
+_LAST_OFFSET = max(last for phrase, first, last in REMINDER_RULES.values())
+
+
+def _load_email_templates():
+    """Compile the reminder templates once, with the shared CSS inlined at load time"""
+    env = Environment(
+        loader=FileSystemLoader(EMAIL_TEMPLATE_DIR),
+        autoescape=select_autoescape(['html']),
+        trim_blocks=True,
+        lstrip_blocks=True
+    )
+    with open(os.path.join(EMAIL_TEMPLATE_DIR, 'reminder.css'), encoding='utf-8') as f:
+        env.globals['styles'] = Markup(f.read())
+    return env.get_template('reminder.html'), env.get_template('reminder.txt')
+
+
+_html_template, _text_template = _load_email_templates()
+
+
+def iter_reminder_digests(today, batch_size=1000, user_filter=None):
+    """
+    Stream per-user reminder digests for users whose local date is today
+
+    One query reads every unfinished task due within the span of all reminder
+    rules, with its course name, owner and any sent_reminders rows for its
+    due date (outer-joined on the ledger's unique index). Rows are read in
+    chunks of batch_size, grouped by user in a single pass and matched to a
+    rule by their day offset. A task is included if the user enabled that rule
+    and the ledger has no entry for it, so every rule a user has is merged
+    into one digest and a re-run only picks up what is still unsent.
+
+    Yields (user_id, user_email, user_name, tasks_data) where tasks_data is a
+    list of plain task dictionaries with the matched 'rule'.
+    user_filter is an optional SQL condition on User limiting who is included.
     """
-    Check all users for tasks due tomorrow and send email notifications
-    This function is called by the scheduler daily
+    query = db.session.query(
+        User.id,
+        User.email,
+        User.username,
+        User.reminder_rules,
+        Task.id,
+        Task.title,
+        Task.description,
+        Task.priority,
+        Task.task_type,
+        Task.due_date,
+        Course.name,
+        SentReminder.window,
+    ).select_from(Task).join(Course, Task.course_id == Course.id).join(
+        User, Course.user_id == User.id
+    ).outerjoin(SentReminder, and_(
+        SentReminder.task_id == Task.id,
+        SentReminder.due_date == Task.due_date
+    )).filter(
+        User.email_notifications_enabled.is_(True),
+        Task.due_date.between(today + timedelta(days=_FIRST_OFFSET), today + timedelta(days=_LAST_OFFSET)),
+        Task.status != 'completed'
+    )
+    if user_filter is not None:
+        query = query.filter(user_filter)
+    query = query.order_by(User.id, Task.due_date, Task.priority.desc(), Task.id).yield_per(batch_size)
+
+    today_ordinal = today.toordinal()
+    for (user_id, user_email, user_name, rules), user_rows in groupby(query, key=lambda row: row[:4]):
+        enabled = set(rules.split(',')) if rules else set()
+        tasks_data = []
+        # A task has one row per ledger entry for its due date (or one with no window)
+        for task_id, task_rows in groupby(user_rows, key=lambda row: row[4]):
+            task_rows = list(task_rows)
+            row = task_rows[0]
+            rule = _RULE_BY_OFFSET.get(row.due_date.toordinal() - today_ordinal)
+            if rule not in enabled or any(r.window == rule for r in task_rows):
+                continue
+            tasks_data.append({
+                'id': task_id,
+                'rule': rule,
+                'title': row.title,
+                'description': row.description or '',
+                'priority': row.priority,
+                'task_type': row.task_type,
+                'course_name': row.name,
+                'due_date': str(row.due_date)
+            })
+        if tasks_data:
+            yield user_id, user_email, user_name, tasks_data
+
+
+class ReminderLedger:
+    """
+    Buffered writer of sent_reminders rows
+
+    record() may be called from delivery worker threads. Rows are written in
+    batches of flush_every, so a crashed run re-sends at most that many
+    emails when it is restarted.
+    """
+
+    def __init__(self, flush_every=100):
+        self.flush_every = flush_every
+        self._rows = []
+        self._lock = threading.Lock()
+
+    def record(self, user_id, tasks_data):
+        """Note that the reminders for these tasks (each under its 'rule') were delivered to user_id"""
+        sent_at = datetime.utcnow()
+        with self._lock:
+            self._rows.extend({
+                'user_id': user_id,
+                'task_id': task['id'],
+                'window': task['rule'],
+                'due_date': date.fromisoformat(task['due_date']),
+                'sent_at': sent_at
+            } for task in tasks_data)
+            if len(self._rows) >= self.flush_every:
+                self._write()
+
+    def flush(self):
+        """Write any buffered rows"""
+        with self._lock:
+            self._write()
+
+    def _write(self):
+        rows, self._rows = self._rows, []
+        if not rows:
+            return
+        try:
+            db.session.execute(insert(SentReminder), rows)
+            db.session.commit()
+        except IntegrityError:
+            # Another run recorded some of these already; keep the rest
+            db.session.rollback()
+            for row in rows:
+                try:
+                    db.session.execute(insert(SentReminder), row)
+                    db.session.commit()
+                except IntegrityError:
+                    db.session.rollback()
+
+
+def plan_reminder_shards(window_start, window_end, shards_per_hour=4):
     """
-    tomorrow = date.today() + timedelta(days=1)
+    Find the user shards whose reminders are due in [window_start, window_end)
+    
+    Each user is sent their reminder at notification_hour in their own time
+    zone. Within that hour users are spread over shards_per_hour evenly spaced
+    send times by user id, so no single moment carries a whole hour's load.
+    Only the distinct (timezone, notification_hour) pairs are read from the
+    database. Window bounds are naive server local times.
     
-    # Get all users with notifications enabled
-    users = User.query.filter_by(email_notifications_enabled=True).all()
+    Returns {local_date: [(timezone, hour, shard), ...]} where local_date is
+    the date in that time zone at the send time.
+    """
+    window_start = window_start.astimezone()
+    window_end = window_end.astimezone()
+    # Only users with unfinished tasks inside some rule's span can be due, so
+    # the pairs are read through the due-date index rather than all users.
+    # Local dates are at most one day either side of the UTC date.
+    first_due = window_start.astimezone(timezone.utc).date() + timedelta(days=_FIRST_OFFSET - 1)
+    last_due = window_end.astimezone(timezone.utc).date() + timedelta(days=_LAST_OFFSET + 1)
+    pairs = db.session.query(User.timezone, User.notification_hour).select_from(Task).join(
+        Course, Task.course_id == Course.id
+    ).join(User, Course.user_id == User.id).filter(
+        Task.due_date.between(first_due, last_due),
+        Task.status != 'completed',
+        User.email_notifications_enabled.is_(True)
+    ).distinct().all()
     
-    for user in users:
-        # Get tasks due tomorrow for this user
-        tasks_due_tomorrow = Task.query.join(Course).filter(
-            Course.user_id == user.id,
-            Task.due_date == tomorrow,
-            Task.status != 'completed'
-        ).order_by(Task.priority.desc()).all()
-        
-        if tasks_due_tomorrow:
-            send_notification_email(mail, user, tasks_due_tomorrow)
-            print(f"Sent notification to {user.username} ({user.email}) for {len(tasks_due_tomorrow)} task(s)")
+    plan = {}
+    for tz_name, hour in pairs:
+        tz = get_timezone(tz_name)
+        day = window_start.astimezone(tz).date()
+        last_day = window_end.astimezone(tz).date()
+        while day <= last_day:
+            for shard in range(shards_per_hour):
+                send_at = datetime.combine(day, time(hour, shard * 60 // shards_per_hour), tzinfo=tz)
+                if window_start <= send_at < window_end:
+                    plan.setdefault(day, []).append((tz_name, hour, shard))
+            day += timedelta(days=1)
+    return plan
 
 
-def send_notification_email(mail, user, tasks):
-    """
-    Send email notification to user with list of tasks due tomorrow
+def iter_planned_digests(plan, shards_per_hour=4, batch_size=1000):
+    """Stream the digests of every shard in a plan made by plan_reminder_shards"""
+    for local_date, shards in sorted(plan.items()):
+        user_filter = or_(*[
+            and_(
+                User.timezone == tz_name,
+                User.notification_hour == hour,
+                User.id % shards_per_hour == shard
+            )
+            for tz_name, hour, shard in shards
+        ])
+        yield from iter_reminder_digests(local_date, batch_size, user_filter)
+
+
+def check_and_send_notifications(mail, delivery=None, window_start=None, window_end=None):
     """
-    # Create email content
-    subject = f"📚 Task Reminder: {len(tasks)} task{'s' if len(tasks) > 1 else ''} due tomorrow!"
+    Check users' reminder rules and send each of them one digest email
+    This function is called by the scheduler for every time slot
     
-    # HTML email template
-    html_body = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <style>
-            body {{
-                font-family: Arial, sans-serif;
-                line-height: 1.6;
-                color: #333;
-                max-width: 600px;
-                margin: 0 auto;
-                padding: 20px;
-            }}
-            .header {{
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                color: white;
-                padding: 20px;
-                border-radius: 8px 8px 0 0;
-                text-align: center;
-            }}
-            .content {{
-                background: #f9fafb;
-                padding: 20px;
-                border-radius: 0 0 8px 8px;
-            }}
-            .task {{
-                background: white;
-                padding: 15px;
-                margin: 10px 0;
-                border-radius: 8px;
-                border-left: 4px solid #667eea;
-            }}
-            .task.high {{
-                border-left-color: #ef4444;
-            }}
-            .task.medium {{
-                border-left-color: #f59e0b;
-            }}
-            .task.low {{
-                border-left-color: #10b981;
-            }}
-            .task-title {{
-                font-weight: bold;
-                font-size: 16px;
-                margin-bottom: 5px;
-            }}
-            .task-meta {{
-                color: #666;
-                font-size: 14px;
-            }}
-            .priority {{
-                display: inline-block;
-                padding: 2px 8px;
-                border-radius: 4px;
-                font-size: 12px;
-                font-weight: bold;
-                margin-right: 5px;
-            }}
-            .priority.high {{
-                background: #fee2e2;
-                color: #991b1b;
-            }}
-            .priority.medium {{
-                background: #fef3c7;
-                color: #92400e;
-            }}
-            .priority.low {{
-                background: #d1fae5;
-                color: #065f46;
-            }}
-            .footer {{
-                text-align: center;
-                margin-top: 20px;
-                color: #666;
-                font-size: 14px;
-            }}
-            .button {{
-                display: inline-block;
-                padding: 10px 20px;
-                background: #667eea;
-                color: white;
-                text-decoration: none;
-                border-radius: 6px;
-                margin-top: 15px;
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="header">
-            <h1>📚 Student Life Organizer</h1>
-            <p>Task Reminder for {user.username}</p>
-        </div>
-        <div class="content">
-            <p>Hi {user.username},</p>
-            <p>You have <strong>{len(tasks)} task{'s' if len(tasks) > 1 else ''}</strong> due <strong>tomorrow</strong>:</p>
-            
-            {''.join([f'''
-            <div class="task {task.priority}">
-                <div class="task-title">{task.title}</div>
-                <div class="task-meta">
-                    <span class="priority {task.priority}">{task.priority.upper()}</span>
-                    <strong>{task.course.name}</strong> • {task.task_type.title()}
-                </div>
-                {f'<p style="margin-top: 8px; color: #666;">{task.description}</p>' if task.description else ''}
-            </div>
-            ''' for task in tasks])}
-            
-            <div style="text-align: center;">
-                <a href="http://127.0.0.1:5000" class="button">View Dashboard</a>
-            </div>
-        </div>
-        <div class="footer">
-            <p>This is an automated reminder from Student Life Organizer</p>
-            <p style="font-size: 12px;">You can disable notifications in your account settings</p>
-        </div>
-    </body>
-    </html>
+    With a window, only users whose local send time falls inside it are
+    emailed, with rules evaluated against their own local date (see
+    plan_reminder_shards). Without one, every user is emailed with rules
+    evaluated against the server's date.
+    
+    Messages go out over pooled SMTP connections. Pass a delivery subsystem
+    (see delivery.create_delivery) to reuse its connections; otherwise one is
+    built from the app config for this run.
+    Returns a (sent, failed) tuple.
     """
+    if window_start is None:
+        digests = iter_reminder_digests(date.today())
+    else:
+        shards_per_hour = current_app.config.get('REMINDER_SHARDS_PER_HOUR', 4)
+        plan = plan_reminder_shards(window_start, window_end, shards_per_hour)
+        digests = iter_planned_digests(plan, shards_per_hour)
+    
+    owns_delivery = delivery is None
+    if owns_delivery:
+        delivery = create_delivery(mail, current_app.config)
     
-    # Plain text version
-    text_body = f"""
-    Student Life Organizer - Task Reminder
+    ledger = ReminderLedger()
     
-    Hi {user.username},
+    def report(msg, error):
+        if error:
+            print(f"Error sending email to {msg.recipients[0]}: {str(error)}")
+        else:
+            ledger.record(*msg.reminder)
+            print(f"Sent notification to {msg.recipients[0]}")
     
-    You have {len(tasks)} task{'s' if len(tasks) > 1 else ''} due tomorrow:
+    try:
+        return delivery.send_many(build_notification_messages(digests), on_result=report)
+    finally:
+        ledger.flush()
+        if owns_delivery:
+            delivery.close()
+
+
+def prune_sent_reminders(retention_days):
+    """
+    Delete ledger rows for due dates more than retention_days in the past
+
+    The earliest due date any rule looks at is OVERDUE_LOOKBACK_DAYS before a
+    user's local today, so older rows can no longer suppress a reminder. The
+    retention is raised to that lookback plus a day for time zones ahead of
+    the server. Returns the number of rows deleted.
+    """
+    retention_days = max(retention_days, OVERDUE_LOOKBACK_DAYS + 1)
+    cutoff = date.today() - timedelta(days=retention_days)
+    removed = db.session.execute(delete(SentReminder).where(SentReminder.due_date < cutoff)).rowcount
+    db.session.commit()
+    return removed
+
+
+def task_email_data(task):
+    """Extract the plain data the reminder templates need from a Task"""
+    return {
+        'title': task.title,
+        'description': task.description or '',
+        'priority': task.priority,
+        'task_type': task.task_type,
+        'course_name': task.course.name,
+        'due_date': str(task.due_date)
+    }
+
+
+def render_notification(user_name, tasks_data):
+    """
+    Render the reminder subject, plain text and HTML bodies for one user
     
-    {''.join([f'• {task.title} ({task.priority.upper()}) - {task.course.name}\n' for task in tasks])}
+    Tasks are listed in one section per reminder rule, in REMINDER_RULES
+    order; tasks without a 'rule' are treated as due tomorrow.
     
-    Visit http://127.0.0.1:5000 to view your dashboard.
+    Args:
+        user_name: User's username
+        tasks_data: List of task dictionaries (NOT database objects)
+    """
+    by_rule = {}
+    for task in tasks_data:
+        by_rule.setdefault(task.get('rule', DEFAULT_REMINDER_RULE), []).append(task)
+    sections = [(REMINDER_RULES[rule][0], by_rule[rule]) for rule in REMINDER_RULES if rule in by_rule]
     
-    ---
-    This is an automated reminder from Student Life Organizer
+    count = len(tasks_data)
+    if len(sections) == 1:
+        subject = f"📚 Task Reminder: {count} task{'s' if count > 1 else ''} {sections[0][0]}!"
+    else:
+        subject = f"📚 Task Reminder: {count} tasks need your attention"
+    context = {'user_name': user_name, 'sections': sections, 'count': count}
+    return subject, _text_template.render(context), _html_template.render(context)
+
+
+def build_notification_message(user_email, user_name, tasks_data):
     """
+    Build the reminder email for one user without sending it
     
-    # Create and send email
-    msg = Message(
+    Args:
+        user_email: User's email address
+        user_name: User's username
+        tasks_data: List of task dictionaries (NOT database objects)
+    """
+    subject, text_body, html_body = render_notification(user_name, tasks_data)
+    return Message(
         subject=subject,
-        sender='Student Life Organizer <noreply@studentorganizer.com>',
-        recipients=[user.email],
+        sender=SENDER,
+        recipients=[user_email],
         body=text_body,
         html=html_body
     )
+
+
+def build_notification_messages(digests):
+    """
+    Lazily build reminder emails for many users
     
-    try:
-        mail.send(msg)
-        return True
-    except Exception as e:
-        print(f"Error sending email to {user.email}: {str(e)}")
-        return False
+    Args:
+        digests: Iterable of (user_id, user_email, user_name, tasks_data)
+            tuples, as yielded by iter_reminder_digests
+    
+    Messages are rendered one at a time from the precompiled templates, so
+    only the message currently being handed off is held in memory. Each
+    message carries the (user_id, tasks_data) it reminds of as msg.reminder,
+    for recording in the ReminderLedger once it is sent.
+    """
+    for user_id, user_email, user_name, tasks_data in digests:
+        msg = build_notification_message(user_email, user_name, tasks_data)
+        msg.reminder = (user_id, tasks_data)
+        yield msg
+
+
+def send_notification_email(mail, user, tasks):
+    """
+    Send email notification to user with list of tasks due tomorrow
+    """
+    return send_notification_email_direct(mail, user.email, user.username, [task_email_data(task) for task in tasks])
 
 
 def send_notification_email_direct(mail, user_email, user_name, tasks_data):
@@ -201,153 +383,7 @@ def send_notification_email_direct(mail, user_email, user_name, tasks_data):
         user_name: User's username
         tasks_data: List of task dictionaries (NOT database objects)
     """
-    # Create email content
-    subject = f"📚 Task Reminder: {len(tasks_data)} task{'s' if len(tasks_data) > 1 else ''} due tomorrow!"
-    
-    # HTML email template
-    html_body = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <style>
-            body {{
-                font-family: Arial, sans-serif;
-                line-height: 1.6;
-                color: #333;
-                max-width: 600px;
-                margin: 0 auto;
-                padding: 20px;
-            }}
-            .header {{
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                color: white;
-                padding: 20px;
-                border-radius: 8px 8px 0 0;
-                text-align: center;
-            }}
-            .content {{
-                background: #f9fafb;
-                padding: 20px;
-                border-radius: 0 0 8px 8px;
-            }}
-            .task {{
-                background: white;
-                padding: 15px;
-                margin: 10px 0;
-                border-radius: 8px;
-                border-left: 4px solid #667eea;
-            }}
-            .task.high {{
-                border-left-color: #ef4444;
-            }}
-            .task.medium {{
-                border-left-color: #f59e0b;
-            }}
-            .task.low {{
-                border-left-color: #10b981;
-            }}
-            .task-title {{
-                font-weight: bold;
-                font-size: 16px;
-                margin-bottom: 5px;
-            }}
-            .task-meta {{
-                color: #666;
-                font-size: 14px;
-            }}
-            .priority {{
-                display: inline-block;
-                padding: 2px 8px;
-                border-radius: 4px;
-                font-size: 12px;
-                font-weight: bold;
-                margin-right: 5px;
-            }}
-            .priority.high {{
-                background: #fee2e2;
-                color: #991b1b;
-            }}
-            .priority.medium {{
-                background: #fef3c7;
-                color: #92400e;
-            }}
-            .priority.low {{
-                background: #d1fae5;
-                color: #065f46;
-            }}
-            .footer {{
-                text-align: center;
-                margin-top: 20px;
-                color: #666;
-                font-size: 14px;
-            }}
-            .button {{
-                display: inline-block;
-                padding: 10px 20px;
-                background: #667eea;
-                color: white;
-                text-decoration: none;
-                border-radius: 6px;
-                margin-top: 15px;
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="header">
-            <h1>📚 Student Life Organizer</h1>
-            <p>Task Reminder for {user_name}</p>
-        </div>
-        <div class="content">
-            <p>Hi {user_name},</p>
-            <p>You have <strong>{len(tasks_data)} task{'s' if len(tasks_data) > 1 else ''}</strong> due <strong>tomorrow</strong>:</p>
-            
-            {''.join([f'''
-            <div class="task {task['priority']}">
-                <div class="task-title">{task['title']}</div>
-                <div class="task-meta">
-                    <span class="priority {task['priority']}">{task['priority'].upper()}</span>
-                    <strong>{task['course_name']}</strong> • {task['task_type'].title()}
-                </div>
-                {f'<p style="margin-top: 8px; color: #666;">{task["description"]}</p>' if task['description'] else ''}
-            </div>
-            ''' for task in tasks_data])}
-            
-            <div style="text-align: center;">
-                <a href="http://127.0.0.1:5000" class="button">View Dashboard</a>
-            </div>
-        </div>
-        <div class="footer">
-            <p>This is an automated reminder from Student Life Organizer</p>
-            <p style="font-size: 12px;">You can disable notifications in your account settings</p>
-        </div>
-    </body>
-    </html>
-    """
-    
-    # Plain text version
-    text_body = f"""
-    Student Life Organizer - Task Reminder
-    
-    Hi {user_name},
-    
-    You have {len(tasks_data)} task{'s' if len(tasks_data) > 1 else ''} due tomorrow:
-    
-    {''.join([f'• {task["title"]} ({task["priority"].upper()}) - {task["course_name"]}\\n' for task in tasks_data])}
-    
-    Visit http://127.0.0.1:5000 to view your dashboard.
-    
-    ---
-    This is an automated reminder from Student Life Organizer
-    """
-    
-    # Create and send email
-    msg = Message(
-        subject=subject,
-        sender='Student Life Organizer <noreply@studentorganizer.com>',
-        recipients=[user_email],
-        body=text_body,
-        html=html_body
-    )
+    msg = build_notification_message(user_email, user_name, tasks_data)
     
     try:
         mail.send(msg)
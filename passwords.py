@@ -0,0 +1,80 @@
+"""
+Password hashing service for Student Life Organizer
+Hashes run on a small bounded thread pool so that bursts of logins cannot
+take over every request thread
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HashingBusy(Exception):
+    """Raised when every hashing slot is taken; the caller should answer 503"""
+
+
+class PasswordHasher:
+    """
+    Hash and verify passwords on a bounded executor
+
+    Configured from the app config:
+        PASSWORD_HASH_METHOD: werkzeug hash method and cost, e.g. 'scrypt:32768:8:1'
+            or 'pbkdf2:sha256:600000'
+        PASSWORD_HASH_WORKERS: threads that run hashes concurrently
+        PASSWORD_HASH_QUEUE_SIZE: hashes allowed to wait for a worker; further
+            requests fail fast with HashingBusy instead of queueing
+
+    The request thread blocks until its hash is done, so a request holding a
+    slot also holds a request thread. WORKERS + QUEUE_SIZE must stay below
+    the server's request threads per process (gunicorn --threads) for at
+    least one thread to remain free for other pages; the defaults of 1 and 0
+    fit the Procfile's two threads.
+
+    Stored hashes made with a different method or cost are reported by
+    needs_rehash() so they can be upgraded on the next successful login.
+    """
+
+    def __init__(self, app=None):
+        self.method = 'scrypt'
+        self._executor = None
+        self._slots = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        workers = app.config.get('PASSWORD_HASH_WORKERS', 1)
+        queue_size = app.config.get('PASSWORD_HASH_QUEUE_SIZE', 0)
+        # Hash once at startup to validate the method and learn its full
+        # parameter string as werkzeug stores it (e.g. 'scrypt:32768:8:1')
+        sample = generate_password_hash('', app.config.get('PASSWORD_HASH_METHOD', 'scrypt'))
+        self.method = sample.split('$', 1)[0]
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def _run(self, fn, *args):
+        """Run fn on the executor and wait for it, or raise HashingBusy when full"""
+        if self._executor is None:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy()
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+    def hash(self, password):
+        """Hash a password with the configured method"""
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        """Check a password against a stored hash"""
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """True if pwhash was made with a different method or cost than configured"""
+        return pwhash.split('$', 1)[0] != self.method
+
+
+hasher = PasswordHasher()
@@ -0,0 +1,157 @@
+"""
+Login and registration rate limiting for Student Life Organizer
+Token buckets keyed by client IP and by username, checked before any
+database access or password hashing
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import request
+
+
+class MemoryBucketStore:
+    """Token buckets held in this process, evicting the least recently used past max_keys"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate):
+        """
+        Take one token from the bucket for key
+
+        The bucket holds up to `capacity` tokens and refills at `rate` tokens
+        per second. Returns 0 when a token was taken, otherwise the number of
+        seconds until one is available.
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class RedisBucketStore:
+    """Token buckets in a Redis-compatible server, shared by all workers"""
+
+    # Refill and take atomically on the server; returns the wait in milliseconds
+    TAKE_SCRIPT = """
+    local capacity = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(bucket[1]) or capacity
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+    local wait = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        wait = (1 - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+    return math.ceil(wait * 1000)
+    """
+
+    def __init__(self, url):
+        import redis  # optional dependency, only needed for this backend
+        self.client = redis.Redis.from_url(url)
+        self._take = self.client.register_script(self.TAKE_SCRIPT)
+
+    def take(self, key, capacity, rate):
+        return self._take(keys=[f'ratelimit:{key}'], args=[capacity, rate, time.time()]) / 1000
+
+
+class RateLimiter:
+    """
+    Per-IP and per-username token buckets for credential endpoints
+
+    Configured from the app config:
+        RATE_LIMIT_ENABLED: turn limiting off entirely
+        RATE_LIMIT_BACKEND: 'memory' (default) or 'redis'
+        RATE_LIMIT_URL: Redis URL for the redis backend
+        RATE_LIMIT_IP_BURST, RATE_LIMIT_IP_PER_MINUTE: bucket size and refill
+            rate per client IP
+        RATE_LIMIT_USERNAME_BURST, RATE_LIMIT_USERNAME_PER_MINUTE: bucket size
+            and refill rate per submitted username
+    """
+
+    def __init__(self, app=None):
+        self.store = None
+        self.enabled = False
+        self._stats = {'allowed': 0, 'rejected_ip': 0, 'rejected_username': 0}
+        self._stats_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('RATE_LIMIT_ENABLED', True)
+        if app.config.get('RATE_LIMIT_BACKEND', 'memory') == 'redis':
+            self.store = RedisBucketStore(app.config['RATE_LIMIT_URL'])
+        else:
+            self.store = MemoryBucketStore()
+        self.ip_limit = (
+            app.config.get('RATE_LIMIT_IP_BURST', 20),
+            app.config.get('RATE_LIMIT_IP_PER_MINUTE', 10) / 60
+        )
+        self.username_limit = (
+            app.config.get('RATE_LIMIT_USERNAME_BURST', 5),
+            app.config.get('RATE_LIMIT_USERNAME_PER_MINUTE', 5) / 60
+        )
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def check(self, ip, username):
+        """Take a token for the IP and the username; returns 0 or seconds to wait"""
+        wait = self.store.take(f'ip:{ip}', *self.ip_limit)
+        if wait:
+            self._count('rejected_ip')
+            return wait
+        if username:
+            wait = self.store.take(f'user:{username.strip().lower()}', *self.username_limit)
+            if wait:
+                self._count('rejected_username')
+                return wait
+        self._count('allowed')
+        return 0
+
+    def limit(self, view):
+        """Decorator that rate limits the POST requests of a view"""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if self.enabled and request.method == 'POST':
+                wait = self.check(request.remote_addr, request.form.get('username'))
+                if wait:
+                    return (
+                        'Too many attempts, please try again later',
+                        429,
+                        {'Retry-After': str(math.ceil(wait)), 'Content-Type': 'text/plain'}
+                    )
+            return view(*args, **kwargs)
+        return wrapper
+
+    def stats(self):
+        """Allowed and rejected attempt counts"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['tracked_keys'] = len(self.store) if isinstance(self.store, MemoryBucketStore) else None
+        stats['enabled'] = self.enabled
+        return stats
@@ -0,0 +1,93 @@
+"""
+Per-user data revisions for Student Life Organizer
+Every transaction that changes a user's courses or tasks bumps that user's
+data_revision and data_updated_at in the same transaction
+"""
+from datetime import datetime
+from flask import has_request_context
+from flask_login import current_user
+from sqlalchemy import event, select, update
+from models import User, Course, Task
+
+_commit_callbacks = []
+
+
+def register(session):
+    """
+    Track data revisions through SQLAlchemy session events
+    
+    Unit-of-work changes are attributed to the course owner after each flush;
+    bulk INSERT/UPDATE/DELETE statements on tasks or courses are attributed to
+    the logged-in user.
+    """
+    event.listen(session, 'after_flush', _after_flush)
+    event.listen(session, 'do_orm_execute', _do_orm_execute)
+    event.listen(session, 'after_commit', _after_commit)
+    event.listen(session, 'after_soft_rollback', _after_rollback)
+
+
+def on_commit(callback):
+    """Call callback(user_ids) after every commit that changed those users' data"""
+    _commit_callbacks.append(callback)
+
+
+def get_revision(session, user_id):
+    """Return (data_revision, data_updated_at) for a user with one primary-key lookup"""
+    return session.execute(
+        select(User.data_revision, User.data_updated_at).where(User.id == user_id)
+    ).one()
+
+
+def _bump(session, connection, user_ids):
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if not user_ids:
+        return
+    connection.execute(
+        update(User).where(User.id.in_(user_ids)).values(
+            data_revision=User.data_revision + 1,
+            data_updated_at=datetime.utcnow()
+        )
+    )
+    session.info.setdefault('revision_users', set()).update(user_ids)
+
+
+def _after_flush(session, flush_context):
+    users = set()
+    course_ids = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Course):
+            users.add(obj.user_id)
+        elif isinstance(obj, Task):
+            course = obj.__dict__.get('course')
+            if course is not None:
+                users.add(course.user_id)
+            else:
+                course_ids.add(obj.course_id)
+    connection = session.connection()
+    if course_ids:
+        users.update(connection.execute(
+            select(Course.user_id).where(Course.id.in_(course_ids))
+        ).scalars())
+    _bump(session, connection, users)
+
+
+def _do_orm_execute(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.class_ not in (Course, Task):
+        return
+    if has_request_context() and current_user.is_authenticated:
+        session = orm_execute_state.session
+        _bump(session, session.connection(), {current_user.id})
+
+
+def _after_commit(session):
+    user_ids = session.info.pop('revision_users', None)
+    if user_ids:
+        for callback in _commit_callbacks:
+            callback(user_ids)
+
+
+def _after_rollback(session, previous_transaction):
+    session.info.pop('revision_users', None)
@@ -0,0 +1,84 @@
+"""
+Read/write session routing for Student Life Organizer
+Reads made by read-only views go to a replica bind; all writes go to the primary
+"""
+import itertools
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from flask import g, has_request_context
+from flask_sqlalchemy.session import Session
+
+REPLICA_BIND_PREFIX = 'replica_'
+
+_replica_cycle_lock = threading.Lock()
+_replica_cycles = {}
+
+
+def replica_binds(replica_urls):
+    """Map a list of replica database URIs to SQLALCHEMY_BINDS entries"""
+    return {f'{REPLICA_BIND_PREFIX}{index}': url for index, url in enumerate(replica_urls)}
+
+
+def read_only(view):
+    """Mark a view as read-only so its queries may be served by a replica"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_read_only = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@contextmanager
+def primary_reads():
+    """
+    Send the reads made inside the block to the primary, even in a read-only view
+
+    For results that outlive the request, such as cache fills, which must not
+    capture a replica that has not caught up with the user's last write.
+    """
+    if not has_request_context():
+        yield
+        return
+    read_only = g.get('db_read_only', False)
+    g.db_read_only = False
+    try:
+        yield
+    finally:
+        g.db_read_only = read_only
+
+
+def _next_replica_key(engines):
+    """Round-robin over the configured replica binds"""
+    keys = tuple(sorted(key for key in engines if key and key.startswith(REPLICA_BIND_PREFIX)))
+    if not keys:
+        return None
+    with _replica_cycle_lock:
+        cycle = _replica_cycles.get(keys)
+        if cycle is None:
+            cycle = _replica_cycles[keys] = itertools.cycle(keys)
+        return next(cycle)
+
+
+class RoutingSession(Session):
+    """
+    Session that sends SELECTs from read-only requests to a replica
+    
+    A request sticks to one replica for all of its reads. Flushes, writes and
+    anything outside a read-only request use the normal (primary) bind.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and not self._flushing
+            and getattr(clause, 'is_select', False)
+            and has_request_context()
+            and g.get('db_read_only')
+        ):
+            engines = self._db.engines
+            if 'db_replica' not in g:
+                g.db_replica = _next_replica_key(engines)
+            if g.db_replica is not None:
+                return engines[g.db_replica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
@@ -0,0 +1,334 @@
+"""
+In-process job scheduler for Student Life Organizer
+Runs jobs such as the daily reminder digest on cron-like schedules. Every
+gunicorn worker runs a scheduler thread, and a lease row in the job_locks
+table elects the single process that runs each job
+"""
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from models import db, JobLock, JobRun
+
+
+class CronSchedule:
+    """
+    Standard five-field cron expression: minute hour day-of-month month day-of-week
+
+    Fields accept '*', numbers, ranges ('1-5'), lists ('1,15') and steps
+    ('*/15', '9-17/2'). Day of week runs 0-6 from Sunday (7 is also Sunday).
+    As in cron, when both day fields are restricted a day matching either runs.
+    """
+
+    FIELDS = (('minute', 0, 59), ('hour', 0, 23), ('day', 1, 31), ('month', 1, 12), ('weekday', 0, 7))
+
+    def __init__(self, expression):
+        self.expression = expression
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"Cron expression must have 5 fields: '{expression}'")
+        values = {}
+        for part, (name, low, high) in zip(parts, self.FIELDS):
+            values[name] = self._parse_field(part, name, low, high)
+        self.minutes = sorted(values['minute'])
+        self.hours = sorted(values['hour'])
+        self.days = values['day']
+        self.months = values['month']
+        self.weekdays = {day % 7 for day in values['weekday']}
+        self.any_day = parts[2] == '*'
+        self.any_weekday = parts[4] == '*'
+
+    @staticmethod
+    def _parse_field(field, name, low, high):
+        values = set()
+        for item in field.split(','):
+            spec, _, step = item.partition('/')
+            try:
+                step = int(step) if step else 1
+                if spec == '*':
+                    start, end = low, high
+                elif '-' in spec:
+                    start, end = (int(value) for value in spec.split('-', 1))
+                else:
+                    start = end = int(spec)
+                    if step != 1:
+                        end = high
+            except ValueError:
+                raise ValueError(f"Invalid cron {name} field: '{field}'")
+            if step < 1 or start < low or end > high or start > end:
+                raise ValueError(f"Invalid cron {name} field: '{field}'")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def matches_day(self, day):
+        """True if the schedule fires at some time on this date"""
+        if day.month not in self.months:
+            return False
+        # Python weekday() is Monday=0; cron is Sunday=0
+        weekday_match = (day.weekday() + 1) % 7 in self.weekdays
+        day_match = day.day in self.days
+        if self.any_day:
+            return weekday_match
+        if self.any_weekday:
+            return day_match
+        return day_match or weekday_match
+
+    def latest_at_or_before(self, moment, max_days=366):
+        """The latest slot at or before moment, or None if none in the last max_days"""
+        moment = moment.replace(second=0, microsecond=0)
+        for offset in range(max_days + 1):
+            day = moment.date() - timedelta(days=offset)
+            if not self.matches_day(day):
+                continue
+            for hour in reversed(self.hours):
+                for minute in reversed(self.minutes):
+                    slot = datetime(day.year, day.month, day.day, hour, minute)
+                    if slot <= moment:
+                        return slot
+        return None
+
+    def next_after(self, moment, max_days=366):
+        """The first slot strictly after moment, or None if none in the next max_days"""
+        moment = moment.replace(second=0, microsecond=0)
+        for offset in range(max_days + 1):
+            day = moment.date() + timedelta(days=offset)
+            if not self.matches_day(day):
+                continue
+            for hour in self.hours:
+                for minute in self.minutes:
+                    slot = datetime(day.year, day.month, day.day, hour, minute)
+                    if slot > moment:
+                        return slot
+        return None
+
+
+class Scheduler:
+    """
+    Run registered jobs on their schedules, once per slot across all workers
+
+    Configured from the app config:
+        SCHEDULER_POLL_SECONDS: how often due jobs are checked
+        SCHEDULER_LOCK_SECONDS: lease taken by the worker running a job; a
+            worker that dies mid-run releases the job after this long
+        SCHEDULER_CATCHUP_HOURS: a slot missed while no worker was running is
+            still run if it is at most this old; older slots are skipped
+        SCHEDULER_MAX_ATTEMPTS: times a slot is tried before it is given up on
+
+    Schedules are evaluated in server local time. Only the latest missed slot
+    is run, with a window that also covers the slots missed before it. A run
+    that failed, or whose worker died before finishing (its lease expired),
+    is run again for the same window, so jobs must be safe to re-run.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.jobs = {}
+        self.owner = f'{socket.gethostname()}:{os.getpid()}'
+        self._thread = None
+        self._stopping = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.poll_seconds = app.config.get('SCHEDULER_POLL_SECONDS', 30)
+        self.lock_seconds = app.config.get('SCHEDULER_LOCK_SECONDS', 3600)
+        self.catchup = timedelta(hours=app.config.get('SCHEDULER_CATCHUP_HOURS', 12))
+        self.max_attempts = app.config.get('SCHEDULER_MAX_ATTEMPTS', 3)
+
+    def add_job(self, name, schedule, func):
+        """
+        Register func(window_start, window_end) to run on a cron schedule
+
+        The window runs from the slot being run up to the next slot, so
+        successive runs cover time without gaps. When missed slots are caught
+        up, the window starts right after the last successful run (no earlier
+        than the catch-up limit). Times are naive server local time, and the
+        function's return value is recorded with the run.
+        """
+        self.jobs[name] = (CronSchedule(schedule), func)
+
+    # ------------------------------------------------------------------
+    # Leader election
+    # ------------------------------------------------------------------
+
+    def _acquire(self, name):
+        """Take or renew the lease on a job; returns False if another process holds it"""
+        now = datetime.utcnow()
+        locked_until = now + timedelta(seconds=self.lock_seconds)
+        acquired = JobLock.query.filter(
+            JobLock.name == name,
+            (JobLock.locked_until < now) | (JobLock.owner == self.owner)
+        ).update({'owner': self.owner, 'locked_until': locked_until}, synchronize_session=False)
+        db.session.commit()
+        if acquired:
+            return True
+        try:
+            db.session.add(JobLock(name=name, owner=self.owner, locked_until=locked_until))
+            db.session.commit()
+            return True
+        except IntegrityError:
+            db.session.rollback()
+            return False
+
+    def _release(self, name):
+        JobLock.query.filter_by(name=name, owner=self.owner).update(
+            {'locked_until': datetime.utcnow()}, synchronize_session=False
+        )
+        db.session.commit()
+
+    # ------------------------------------------------------------------
+    # Running jobs
+    # ------------------------------------------------------------------
+
+    def run_pending(self, now=None):
+        """Run every job whose latest slot is due and has not run yet; returns the runs made"""
+        now = now or datetime.now()
+        runs = []
+        for name, (schedule, func) in self.jobs.items():
+            slot = schedule.latest_at_or_before(now)
+            if slot is None or now - slot > self.catchup:
+                continue
+            run = JobRun.query.filter_by(job_name=name, scheduled_for=slot).first()
+            if run is not None and not self._retryable(run):
+                continue
+            if not self._acquire(name):
+                continue
+            try:
+                window_start = self._window_start(name, schedule, slot, now)
+                window_end = schedule.next_after(slot) or slot + timedelta(days=1)
+                run = self._run_job(name, slot, lambda: func(window_start, window_end))
+                if run is not None:
+                    runs.append(run)
+            finally:
+                self._release(name)
+        return runs
+
+    def _retryable(self, run):
+        """
+        True if a recorded run should be tried again
+
+        A 'running' row is only claimed once its owner's lease has expired,
+        which _acquire() checks, since a live owner keeps the lease.
+        """
+        return run.status in ('running', 'failed') and run.attempts < self.max_attempts
+
+    def _window_start(self, name, schedule, slot, now):
+        """
+        Start of the window for slot, reaching back over the slots since the
+        last successful run before it (missed, failed or never finished)
+        """
+        earlier = JobRun.query.filter(JobRun.job_name == name, JobRun.scheduled_for < slot)
+        last_run = earlier.filter(JobRun.status == 'succeeded').order_by(JobRun.scheduled_for.desc()).first()
+        if last_run is not None:
+            first_missed = schedule.next_after(last_run.scheduled_for)
+        else:
+            # Nothing has succeeded yet; reach back to the first slot ever tried
+            first_run = earlier.order_by(JobRun.scheduled_for).first()
+            if first_run is None:
+                return slot
+            first_missed = first_run.scheduled_for
+        if first_missed is None or first_missed >= slot:
+            return slot
+        return max(first_missed, now - self.catchup)
+
+    def _claim(self, name, slot):
+        """Record a new run of a slot, or take over a retryable one; None if another worker got it"""
+        claimed = JobRun.query.filter(
+            JobRun.job_name == name,
+            JobRun.scheduled_for == slot,
+            JobRun.status.in_(('running', 'failed')),
+            JobRun.attempts < self.max_attempts
+        ).update({
+            'owner': self.owner,
+            'status': 'running',
+            'started_at': datetime.utcnow(),
+            'finished_at': None,
+            'error': None,
+            'attempts': JobRun.attempts + 1
+        }, synchronize_session=False)
+        db.session.commit()
+        if claimed:
+            return JobRun.query.filter_by(job_name=name, scheduled_for=slot).one()
+        try:
+            run = JobRun(job_name=name, scheduled_for=slot, owner=self.owner)
+            db.session.add(run)
+            db.session.commit()
+            return run
+        except IntegrityError:
+            db.session.rollback()
+            return None
+
+    def _run_job(self, name, slot, func):
+        """Record and execute one slot of a job, unless another worker already did"""
+        run = self._claim(name, slot)
+        if run is None:
+            return None
+
+        if run.attempts > 1:
+            print(f"Retrying scheduled job {name} for {slot:%Y-%m-%d %H:%M} (attempt {run.attempts})")
+        else:
+            print(f"Running scheduled job {name} for {slot:%Y-%m-%d %H:%M}")
+        started = time.monotonic()
+        try:
+            result = func()
+            run.status = 'succeeded'
+            run.result = None if result is None else str(result)
+        except Exception as e:
+            db.session.rollback()
+            run.status = 'failed'
+            run.error = str(e)
+            print(f"✗ Scheduled job {name} failed: {str(e)}")
+        run.finished_at = datetime.utcnow()
+        run.duration_seconds = time.monotonic() - started
+        db.session.commit()
+        if run.status == 'succeeded':
+            print(f"✓ Scheduled job {name} finished in {run.duration_seconds:.1f}s")
+        return run
+
+    def stats(self):
+        """Last run and next slot of every job"""
+        stats = {}
+        now = datetime.now()
+        for name, (schedule, func) in self.jobs.items():
+            last_run = JobRun.query.filter_by(job_name=name).order_by(JobRun.scheduled_for.desc()).first()
+            next_slot = schedule.next_after(now)
+            stats[name] = {
+                'schedule': schedule.expression,
+                'next_run': next_slot.isoformat() if next_slot else None,
+                'last_run': last_run.to_dict() if last_run else None
+            }
+        return stats
+
+    # ------------------------------------------------------------------
+    # Background thread
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Start checking for due jobs in a background thread"""
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._loop, name='scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop the background thread after its current check"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _loop(self):
+        with self.app.app_context():
+            while not self._stopping.is_set():
+                try:
+                    self.run_pending()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"✗ Scheduler error: {str(e)}")
+                finally:
+                    db.session.remove()
+                self._stopping.wait(self.poll_seconds)
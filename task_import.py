@@ -0,0 +1,197 @@
+"""
+Bulk task import for Student Life Organizer
+Parses JSON, CSV and iCalendar uploads, validates every row and inserts tasks in batches
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from sqlalchemy import insert
+from models import db, Course, Task, TASK_TYPES, TASK_STATUSES, TASK_PRIORITIES
+
+IMPORT_BATCH_SIZE = 500
+
+
+class ImportFormatError(ValueError):
+    """Raised when an uploaded file cannot be parsed at all"""
+
+
+def parse_json(text):
+    """Parse a JSON list of task objects, or an object with a "tasks" list"""
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ImportFormatError(f'Invalid JSON: {e}')
+    if isinstance(data, dict):
+        data = data.get('tasks')
+    if not isinstance(data, list):
+        raise ImportFormatError('JSON must be a list of tasks or {"tasks": [...]}')
+    return data
+
+
+def parse_csv(text):
+    """Parse CSV with a header row naming the task fields"""
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames:
+        raise ImportFormatError('CSV file is empty')
+    return list(reader)
+
+
+def _unfold_ics_lines(text):
+    """Join iCalendar continuation lines (lines starting with a space or tab)"""
+    lines = []
+    for line in text.splitlines():
+        if line[:1] in (' ', '\t') and lines:
+            lines[-1] += line[1:]
+        elif line:
+            lines.append(line)
+    return lines
+
+
+def _unescape_ics(value):
+    return value.replace('\\n', '\n').replace('\\N', '\n').replace('\\,', ',').replace('\\;', ';').replace('\\\\', '\\')
+
+
+def parse_ics(text):
+    """
+    Parse VEVENT and VTODO entries from an iCalendar file
+    
+    SUMMARY becomes the title, DESCRIPTION the description, DUE (or DTSTART)
+    the due date and a CATEGORIES value of assignment/quiz/exam the task type.
+    Entries carry no course, so the caller supplies one as a default.
+    """
+    rows = []
+    current = None
+    for line in _unfold_ics_lines(text):
+        name, _, value = line.partition(':')
+        key = name.split(';', 1)[0].upper()
+        if key == 'BEGIN' and value.upper() in ('VEVENT', 'VTODO'):
+            current = {}
+        elif key == 'END' and value.upper() in ('VEVENT', 'VTODO') and current is not None:
+            rows.append(current)
+            current = None
+        elif current is not None:
+            if key == 'SUMMARY':
+                current['title'] = _unescape_ics(value)
+            elif key == 'DESCRIPTION':
+                current['description'] = _unescape_ics(value)
+            elif key == 'CATEGORIES':
+                for category in value.lower().split(','):
+                    if category.strip() in TASK_TYPES:
+                        current['task_type'] = category.strip()
+            elif key == 'DUE' or (key == 'DTSTART' and 'due_date' not in current):
+                # Dates are YYYYMMDD, datetimes YYYYMMDDTHHMMSS[Z]
+                raw = value[:8]
+                current['due_date'] = f'{raw[:4]}-{raw[4:6]}-{raw[6:8]}' if len(raw) == 8 else value
+    if not rows and 'BEGIN:VCALENDAR' not in text.upper():
+        raise ImportFormatError('Not an iCalendar file')
+    return rows
+
+
+PARSERS = {
+    'json': parse_json,
+    'csv': parse_csv,
+    'ics': parse_ics,
+}
+
+
+def _validate_row(row, defaults):
+    """Return (task_values, None) for a valid row or (None, error message)"""
+    if not isinstance(row, dict):
+        return None, 'Row must be an object'
+    
+    def field(name):
+        value = row.get(name)
+        if value is None or value == '':
+            value = defaults.get(name)
+        return value.strip() if isinstance(value, str) else value
+    
+    title = field('title')
+    description = field('description') or ''
+    due_date_str = field('due_date')
+    task_type = field('task_type')
+    course_id = field('course_id')
+    status = field('status') or 'pending'
+    priority = field('priority') or 'medium'
+    
+    if not all([title, due_date_str, task_type, course_id]):
+        return None, 'Missing required fields (title, due_date, task_type, course_id)'
+    for name, value in (('title', title), ('description', description), ('due_date', due_date_str),
+                        ('task_type', task_type), ('status', status), ('priority', priority)):
+        if not isinstance(value, str):
+            return None, f'{name} must be a string'
+    if len(title) > 200:
+        return None, 'Title is longer than 200 characters'
+    try:
+        due_date = datetime.strptime(str(due_date_str), '%Y-%m-%d').date()
+    except ValueError:
+        return None, f'Invalid due_date {due_date_str!r}, expected YYYY-MM-DD'
+    if task_type not in TASK_TYPES:
+        return None, f'Invalid task_type {task_type!r}'
+    if status not in TASK_STATUSES:
+        return None, f'Invalid status {status!r}'
+    if priority not in TASK_PRIORITIES:
+        return None, f'Invalid priority {priority!r}'
+    # JSON gives numbers, CSV and form defaults give digit strings; bools and
+    # fractional numbers would otherwise slip through int()
+    if isinstance(course_id, float) and course_id.is_integer():
+        course_id = int(course_id)
+    if isinstance(course_id, str) and course_id.isdigit():
+        course_id = int(course_id)
+    if type(course_id) is not int:
+        return None, f'Invalid course_id {course_id!r}'
+    
+    return {
+        'title': title,
+        'description': description,
+        'due_date': due_date,
+        'task_type': task_type,
+        'status': status,
+        'priority': priority,
+        'course_id': course_id
+    }, None
+
+
+def validate_rows(rows, user_id, defaults=None):
+    """
+    Validate parsed rows for a user
+    
+    Course ownership is checked with one query for all distinct course ids.
+    Returns (valid_tasks, errors) where errors is a list of
+    {'row': <1-based row number>, 'error': <message>}.
+    """
+    defaults = defaults or {}
+    candidates = []
+    errors = []
+    for number, row in enumerate(rows, start=1):
+        values, error = _validate_row(row, defaults)
+        if error:
+            errors.append({'row': number, 'error': error})
+        else:
+            candidates.append((number, values))
+    
+    course_ids = {values['course_id'] for _, values in candidates}
+    owned = set()
+    if course_ids:
+        owned = {course_id for (course_id,) in db.session.query(Course.id).filter(
+            Course.id.in_(course_ids),
+            Course.user_id == user_id
+        )}
+    
+    valid = []
+    for number, values in candidates:
+        if values['course_id'] in owned:
+            values['user_id'] = user_id
+            valid.append(values)
+        else:
+            errors.append({'row': number, 'error': 'Invalid course'})
+    errors.sort(key=lambda error: error['row'])
+    return valid, errors
+
+
+def insert_tasks(tasks, batch_size=IMPORT_BATCH_SIZE):
+    """Insert validated task values with executemany batches in one transaction"""
+    for start in range(0, len(tasks), batch_size):
+        db.session.execute(insert(Task), tasks[start:start + batch_size])
+    db.session.commit()
+    return len(tasks)
@@ -0,0 +1,97 @@
+"""
+Shared pytest fixtures for Student Life Organizer
+The app is imported once, on a temporary SQLite database with its background
+threads, caches and rate limits turned off
+"""
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import event
+
+_db_dir = tempfile.mkdtemp(prefix='student-organizer-tests-')
+os.environ.update({
+    'DATABASE_URL': f'sqlite:///{_db_dir}/test.db',
+    'SCHEDULER_ENABLED': 'False',
+    'EMAIL_QUEUE_ENABLED': 'False',
+    'RATE_LIMIT_ENABLED': 'False',
+    # Caches would hide the statements a page issues on a miss
+    'RESPONSE_CACHE_ENABLED': 'False',
+    'USER_CACHE_TTL': '0',
+    'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app as flask_app  # noqa: E402
+from models import db, User, Course, Task  # noqa: E402
+
+PASSWORD = 'secret1'
+
+
+@pytest.fixture
+def app():
+    """The app with empty tables, inside an app context"""
+    flask_app.config['TESTING'] = True
+    flask_app.extensions['mail'].suppress = True
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+
+
+@pytest.fixture
+def user(app):
+    """A registered user with one course"""
+    user = User(username='student', email='student@example.com')
+    user.set_password(PASSWORD)
+    db.session.add(user)
+    db.session.flush()
+    db.session.add(Course(name='Algorithms', user_id=user.id))
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def client(app, user):
+    """A test client logged in as `user`"""
+    client = app.test_client()
+    client.post('/login', data={'username': user.username, 'password': PASSWORD})
+    return client
+
+
+def add_tasks(user, count, courses=3):
+    """Give a user `count` tasks spread over `courses` new courses and due dates around today"""
+    new_courses = [Course(name=f'Course {index}', user_id=user.id) for index in range(courses)]
+    db.session.add_all(new_courses)
+    db.session.flush()
+    today = date.today()
+    db.session.add_all(
+        Task(
+            title=f'Task {index}',
+            due_date=today + timedelta(days=index % 21 - 7),
+            task_type=('assignment', 'quiz', 'exam')[index % 3],
+            priority=('low', 'medium', 'high')[index % 3],
+            course_id=new_courses[index % courses].id
+        )
+        for index in range(count)
+    )
+    db.session.commit()
+
+
+@contextmanager
+def recorded_statements():
+    """Collect the (sql, parameters) of every statement run on the primary engine"""
+    statements = []
+    
+    def record(connection, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+    
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
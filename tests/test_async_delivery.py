@@ -0,0 +1,231 @@
+"""
+AsyncMailDelivery against an in-memory stand-in for aiosmtplib
+
+The stand-in SMTP sessions keep the recipients they delivered to, can refuse
+a recipient and can drop the connection, so the transport's success,
+rejection, reconnect and result-reporting paths run without a mail server.
+The last test compares it with the threaded MailDelivery on a large run,
+against an smtplib stand-in with the same per-message latency.
+"""
+import asyncio
+import smtplib
+import sys
+import time
+import types
+
+import pytest
+from flask_mail import Message
+
+from app import mail
+from delivery import AsyncMailDelivery, MailDelivery
+
+
+class FakeServer:
+    """Shared state of every session: deliveries, sessions opened, connections to drop"""
+
+    def __init__(self, latency=0):
+        self.latency = latency
+        self.delivered = []
+        self.opened = 0
+        self.drop_next = 0
+        self.open_sessions = 0
+        self.max_open_sessions = 0
+
+
+def fake_aiosmtplib(server):
+    """A module with the parts of aiosmtplib's API that AsyncMailDelivery uses"""
+    module = types.ModuleType('aiosmtplib')
+
+    class SMTPException(Exception):
+        pass
+
+    class SMTPResponseException(SMTPException):
+        def __init__(self, code, message):
+            super().__init__(code, message)
+            self.code = code
+
+    class SMTPRecipientsRefused(SMTPException):
+        pass
+
+    class SMTPServerDisconnected(SMTPException, ConnectionError):
+        pass
+
+    class SMTP:
+        def __init__(self, hostname, port, use_tls, start_tls):
+            self.connected = False
+
+        async def connect(self):
+            server.opened += 1
+            server.open_sessions += 1
+            server.max_open_sessions = max(server.max_open_sessions, server.open_sessions)
+            self.connected = True
+
+        async def login(self, username, password):
+            pass
+
+        async def sendmail(self, sender, recipients, payload):
+            if not self.connected:
+                raise SMTPServerDisconnected('not connected')
+            if server.drop_next:
+                server.drop_next -= 1
+                self.close()
+                raise SMTPServerDisconnected('connection dropped')
+            await asyncio.sleep(server.latency)
+            if recipients[0].startswith('refused'):
+                raise SMTPRecipientsRefused({recipients[0]: (550, 'no such user')})
+            if recipients[0].startswith('rejected'):
+                raise SMTPResponseException(554, 'message rejected')
+            server.delivered.append(recipients[0])
+            return {}, 'OK'
+
+        async def quit(self):
+            self.close()
+
+        def close(self):
+            if self.connected:
+                server.open_sessions -= 1
+            self.connected = False
+
+    module.SMTP = SMTP
+    module.SMTPException = SMTPException
+    module.SMTPResponseException = SMTPResponseException
+    module.SMTPRecipientsRefused = SMTPRecipientsRefused
+    module.SMTPServerDisconnected = SMTPServerDisconnected
+    return module
+
+
+@pytest.fixture
+def server(app, monkeypatch):
+    server = FakeServer()
+    monkeypatch.setitem(sys.modules, 'aiosmtplib', fake_aiosmtplib(server))
+    monkeypatch.setattr(mail.state, 'suppress', False)
+    return server
+
+
+@pytest.fixture
+def delivery(server):
+    delivery = AsyncMailDelivery(mail, concurrency=4, max_messages=10)
+    yield delivery
+    delivery.close()
+
+
+def messages(*recipients):
+    return [Message('Reminder', sender='noreply@example.com', recipients=[to], body='Hi') for to in recipients]
+
+
+def test_send_many_delivers_and_reports_each_message(server, delivery):
+    batch = messages(*[f'student{index}@example.com' for index in range(25)])
+    results = []
+    assert delivery.send_many(iter(batch), on_result=lambda message, error: results.append(error)) == (25, 0)
+    assert sorted(server.delivered) == sorted(message.recipients[0] for message in batch)
+    assert results == [None] * 25
+    # 25 messages over sessions recycled every 10, never more than 4 at once
+    assert 3 <= server.opened <= 12
+    assert server.max_open_sessions <= 4
+
+
+def test_rejections_are_reported_without_retrying(server, delivery):
+    results = {}
+    batch = messages('ok@example.com', 'refused@example.com', 'rejected@example.com')
+    sent, failed = delivery.send_many(batch, on_result=lambda message, error: results.update({message.recipients[0]: error}))
+    assert (sent, failed) == (1, 2)
+    assert results['ok@example.com'] is None
+    assert type(results['refused@example.com']).__name__ == 'SMTPRecipientsRefused'
+    assert type(results['rejected@example.com']).__name__ == 'SMTPResponseException'
+    assert server.delivered == ['ok@example.com']
+
+
+def test_dropped_connection_is_replaced_and_message_retried(server, delivery):
+    assert delivery.send(messages('first@example.com')[0]) is None
+    server.drop_next = 1
+    assert delivery.send(messages('second@example.com')[0]) is None
+    assert server.delivered == ['first@example.com', 'second@example.com']
+    assert server.opened == 2
+
+
+def test_message_fails_after_one_retry(server, delivery):
+    server.drop_next = 2
+    error = delivery.send(messages('student@example.com')[0])
+    assert type(error).__name__ == 'SMTPServerDisconnected'
+    assert server.delivered == []
+
+
+def test_on_result_errors_do_not_stop_the_run(server, delivery):
+    reported = []
+
+    def on_result(message, error):
+        reported.append(message.recipients[0])
+        raise RuntimeError('database is locked')
+
+    batch = messages(*[f'student{index}@example.com' for index in range(50)])
+    assert delivery.send_many(batch, on_result=on_result) == (50, 0)
+    assert len(reported) == 50
+
+
+def test_sessions_run_concurrently(server, delivery):
+    server.latency = 0.01
+    batch = messages(*[f'student{index}@example.com' for index in range(200)])
+    started = time.monotonic()
+    assert delivery.send_many(batch) == (200, 0)
+    # One session at a time would take 200 * 10 ms
+    assert time.monotonic() - started < 2 * 0.6
+    assert server.max_open_sessions == 4
+
+
+def test_close_and_reuse(server, delivery):
+    assert delivery.send(messages('first@example.com')[0]) is None
+    delivery.close()
+    assert server.open_sessions == 0
+    assert delivery.send(messages('second@example.com')[0]) is None
+
+
+def fake_smtplib_smtp(server):
+    """An smtplib.SMTP stand-in for the Flask-Mail connections MailDelivery pools"""
+
+    class SMTP:
+        def __init__(self, host, port):
+            server.opened += 1
+
+        def set_debuglevel(self, level):
+            pass
+
+        def starttls(self):
+            pass
+
+        def login(self, username, password):
+            pass
+
+        def sendmail(self, sender, recipients, payload, mail_options, rcpt_options):
+            time.sleep(server.latency)
+            server.delivered.append(recipients[0])
+            return {}
+
+        def quit(self):
+            pass
+
+    return SMTP
+
+
+def test_async_transport_outpaces_threads_on_a_large_run(server, monkeypatch):
+    """
+    10k messages at 2 ms a message, with each transport's default concurrency
+
+    Rendering a message takes about as long as the simulated send and happens
+    in the calling thread, so the async transport is bound by rendering here;
+    its lead grows with real SMTP round trips.
+    """
+    server.latency = 0.002
+    monkeypatch.setattr(smtplib, 'SMTP', fake_smtplib_smtp(server))
+    batch = messages(*[f'student{index}@example.com' for index in range(10_000)])
+    elapsed = {}
+    for name, transport in [('pool', MailDelivery(mail)), ('async', AsyncMailDelivery(mail))]:
+        server.delivered = []
+        started = time.monotonic()
+        try:
+            assert transport.send_many(iter(batch)) == (10_000, 0)
+        finally:
+            transport.close()
+        elapsed[name] = time.monotonic() - started
+        assert len(server.delivered) == 10_000
+    print(f"10k messages: pool {elapsed['pool']:.2f}s, async {elapsed['async']:.2f}s")
+    assert elapsed['async'] < elapsed['pool']
@@ -0,0 +1,39 @@
+"""
+Validation of PUT /api/tasks/batch
+"""
+import pytest
+
+from conftest import add_tasks
+from models import db, Task
+
+
+@pytest.fixture
+def tasks(user):
+    add_tasks(user, 2, courses=1)
+    return Task.query.order_by(Task.id).all()
+
+
+def test_batch_update(client, tasks):
+    response = client.put('/api/tasks/batch', json=[
+        {'id': tasks[0].id, 'status': 'completed'},
+        {'id': tasks[1].id, 'priority': 'high'},
+    ])
+    assert response.status_code == 200
+    db.session.expire_all()
+    assert (tasks[0].status, tasks[1].priority) == ('completed', 'high')
+
+
+@pytest.mark.parametrize('change, error', [
+    ({}, 'Each change needs an integer id'),
+    ({'id': '1', 'status': 'completed'}, 'Each change needs an integer id'),
+    ({'id': 1}, 'Change needs a status or priority'),
+    ({'id': 1, 'status': 'done'}, "Invalid status 'done'"),
+    ({'id': 1, 'priority': 'urgent'}, "Invalid priority 'urgent'"),
+])
+def test_invalid_changes_are_rejected(client, tasks, change, error):
+    change = {**change, 'id': tasks[0].id} if change.get('id') == 1 else change
+    response = client.put('/api/tasks/batch', json=[{'id': tasks[1].id, 'status': 'completed'}, change])
+    assert response.status_code == 400
+    assert response.get_json()['errors'] == [{'index': 1, 'error': error}]
+    db.session.expire_all()
+    assert tasks[1].status != 'completed'
@@ -0,0 +1,102 @@
+"""
+Streaming export: content round-trips and memory stays flat as rows grow
+"""
+import csv
+import io
+import json
+import tracemalloc
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from export import TASK_EXPORT_FIELDS
+from models import db, Course, Task
+
+# Peak traced memory allowed while streaming an export, whatever its size
+MEMORY_CEILING = 4 * 1024 * 1024
+
+
+def insert_tasks(user, count):
+    """Bulk insert `count` tasks into the user's first course"""
+    course = Course.query.filter_by(user_id=user.id).first()
+    today = date.today()
+    db.session.execute(insert(Task), [
+        {
+            'title': f'Task {index}',
+            'description': 'Read chapter ' * 5,
+            'due_date': today + timedelta(days=index % 365),
+            'task_type': 'assignment',
+            'course_id': course.id,
+            'user_id': user.id,
+        }
+        for index in range(count)
+    ])
+    db.session.commit()
+
+
+def stream_peak(client, path):
+    """Stream a response to the end; returns (lines read, peak traced bytes)"""
+    lines = 0
+    tracemalloc.start()
+    try:
+        # stream_with_context runs the generator up to its first chunk inside get()
+        response = client.get(path, buffered=False)
+        assert response.status_code == 200
+        for chunk in response.response:
+            lines += chunk.count('\n') if isinstance(chunk, str) else chunk.count(b'\n')
+        response.close()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return lines, peak
+
+
+@pytest.mark.parametrize('export_format', ['ndjson', 'csv'])
+def test_memory_does_not_grow_with_rows(client, user, export_format):
+    insert_tasks(user, 2000)
+    small_lines, small_peak = stream_peak(client, f'/api/export?format={export_format}')
+    insert_tasks(user, 18000)
+    large_lines, large_peak = stream_peak(client, f'/api/export?format={export_format}')
+    
+    assert large_lines - small_lines == 18000
+    assert large_peak < MEMORY_CEILING
+    # Ten times the rows may not need much more memory than the small export
+    assert large_peak < small_peak * 2
+
+
+def add_awkward_tasks(user):
+    """Tasks whose text needs quoting in CSV and escaping in JSON"""
+    course = Course.query.filter_by(user_id=user.id).first()
+    course.name = 'Algorithms, "Advanced"'
+    db.session.add_all([
+        Task(title='Essay, draft 1', description='Line one\nLine "two"', due_date=date(2026, 3, 1),
+             task_type='assignment', course_id=course.id),
+        Task(title='Quiz – résumé ✓', description='', due_date=date(2026, 3, 2),
+             task_type='quiz', status='completed', priority='high', course_id=course.id),
+    ])
+    db.session.commit()
+    return [
+        {
+            'id': task.id, 'title': task.title, 'description': task.description,
+            'due_date': task.due_date.isoformat(), 'task_type': task.task_type, 'status': task.status,
+            'priority': task.priority, 'course_id': task.course_id, 'course_name': course.name
+        }
+        for task in Task.query.order_by(Task.due_date, Task.id)
+    ]
+
+
+def test_ndjson_round_trips(client, user):
+    expected = add_awkward_tasks(user)
+    records = [json.loads(line) for line in client.get('/api/export?format=ndjson').get_data(as_text=True).splitlines()]
+    course = Course.query.filter_by(user_id=user.id).one()
+    assert records[0] == {'type': 'course', 'id': course.id, 'name': course.name}
+    assert records[1:] == [{'type': 'task', **task} for task in expected]
+
+
+def test_csv_round_trips(client, user):
+    expected = add_awkward_tasks(user)
+    reader = csv.DictReader(io.StringIO(client.get('/api/export?format=csv').get_data(as_text=True), newline=''))
+    assert reader.fieldnames == TASK_EXPORT_FIELDS
+    stringified = [{name: str(value) for name, value in task.items()} for task in expected]
+    assert list(reader) == stringified
@@ -0,0 +1,44 @@
+"""
+Access to /api/metrics
+"""
+import pytest
+
+TOKEN = 'metrics-token'
+
+
+@pytest.fixture
+def metrics_config(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'ADMIN_USERNAMES', {'admin'})
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', TOKEN)
+    return app.config
+
+
+def test_regular_users_are_refused(client, metrics_config):
+    assert client.get('/api/metrics').status_code == 403
+
+
+def test_anonymous_requests_are_refused(app, metrics_config):
+    assert app.test_client().get('/api/metrics').status_code == 403
+
+
+def test_admin_users_can_read_metrics(client, user, metrics_config):
+    metrics_config['ADMIN_USERNAMES'] = {user.username}
+    response = client.get('/api/metrics')
+    assert response.status_code == 200
+    assert 'scheduler' in response.get_json()
+
+
+@pytest.mark.parametrize('authorization, status', [
+    (f'Bearer {TOKEN}', 200),
+    ('Bearer wrong-token', 403),
+    (TOKEN, 403),
+])
+def test_metrics_token(app, metrics_config, authorization, status):
+    response = app.test_client().get('/api/metrics', headers={'Authorization': authorization})
+    assert response.status_code == status
+
+
+def test_no_token_configured(app, metrics_config):
+    metrics_config['METRICS_TOKEN'] = ''
+    response = app.test_client().get('/api/metrics', headers={'Authorization': 'Bearer '})
+    assert response.status_code == 403
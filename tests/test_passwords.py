@@ -0,0 +1,43 @@
+"""
+Password changes when the hashing pool is saturated
+"""
+import pytest
+
+from conftest import PASSWORD
+from models import db, User
+from passwords import hasher, HashingBusy
+
+NEW_PASSWORD = 'secret2'
+
+
+def change_password(client, current=PASSWORD, new=NEW_PASSWORD, confirm=NEW_PASSWORD):
+    return client.post('/profile/edit', data={
+        'action': 'change_password',
+        'current_password': current,
+        'new_password': new,
+        'confirm_password': confirm,
+    })
+
+
+def stored_hash(user):
+    return db.session.get(User, user.id).password_hash
+
+
+def test_change_password(client, user):
+    assert change_password(client).status_code == 302
+    db.session.expire_all()
+    assert hasher.verify(stored_hash(user), NEW_PASSWORD)
+
+
+@pytest.mark.parametrize('busy', ['verify', 'hash'])
+def test_change_password_when_hashing_is_busy(client, user, monkeypatch, busy):
+    before = stored_hash(user)
+    
+    def refuse(*args):
+        raise HashingBusy()
+    monkeypatch.setattr(hasher, busy, refuse)
+    response = change_password(client)
+    assert response.status_code == 503
+    assert b'The server is busy' in response.data
+    db.session.expire_all()
+    assert stored_hash(user) == before
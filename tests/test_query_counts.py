@@ -0,0 +1,73 @@
+"""
+Statement counts of the task pages and the reminder digest run
+
+Each page loads tasks with their courses in a fixed number of statements, so
+the count must not grow with the number of tasks (no N+1 lazy loads). The
+digest run likewise must not issue statements per user.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import add_tasks, recorded_statements
+from models import db, User
+from notifications import check_and_send_notifications
+
+PAGES = ['/', '/tasks', '/api/tasks']
+
+# Loading the user plus the page's own queries; generous, but constant
+MAX_STATEMENTS = 8
+# Shard planning, the digest query and one ledger insert
+MAX_DIGEST_STATEMENTS = 6
+
+
+def count_statements(client, path):
+    with recorded_statements() as statements:
+        response = client.get(path)
+    assert response.status_code == 200
+    return len(statements)
+
+
+@pytest.mark.parametrize('path', PAGES)
+def test_statement_count_is_constant(client, user, path):
+    add_tasks(user, 5)
+    few = count_statements(client, path)
+    add_tasks(user, 150)
+    many = count_statements(client, path)
+    assert many == few
+    assert few <= MAX_STATEMENTS
+
+
+def add_users(prefix, count):
+    """Register `count` users, each with a course of tasks around today (one due tomorrow)"""
+    users = [User(username=f'{prefix}{index}', email=f'{prefix}{index}@example.com', password_hash='')
+             for index in range(count)]
+    db.session.add_all(users)
+    db.session.commit()
+    for user in users:
+        add_tasks(user, 21, courses=1)
+
+
+def count_digest_statements(app, **window):
+    with recorded_statements() as statements:
+        sent, failed = check_and_send_notifications(app.extensions['mail'], **window)
+    assert failed == 0
+    return sent, len(statements)
+
+
+@pytest.mark.parametrize('windowed', [False, True])
+def test_digest_statement_count_is_constant(app, windowed):
+    """
+    The digest run reads every user's tasks in one query and writes the
+    ledger in batches of 100 emails, so below that its statement count does
+    not depend on how many users are emailed
+    """
+    now = datetime.now()
+    window = {'window_start': now, 'window_end': now + timedelta(days=1)} if windowed else {}
+    add_users('few', 5)
+    few = count_digest_statements(app, **window)
+    add_users('many', 90)
+    many = count_digest_statements(app, **window)
+    assert (few[0], many[0]) == (5, 90)
+    assert many[1] == few[1]
+    assert few[1] <= MAX_DIGEST_STATEMENTS
@@ -0,0 +1,84 @@
+"""
+Query plans of the hot Task/Course queries
+
+Every statement the hot paths run is explained with EXPLAIN QUERY PLAN, and
+each step that reads users, courses, tasks or sent_reminders must search an
+index or the primary key. A SCAN reads the whole table (even when it walks an
+index to get rows in order), and an automatic index is built from one.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import add_tasks, recorded_statements
+from models import db, Task
+from notifications import check_and_send_notifications, prune_sent_reminders
+from app import mail
+
+INDEXED_TABLES = ('users', 'courses', 'tasks', 'sent_reminders')
+
+
+def full_scans(statements):
+    """The plan steps of the given statements that read a whole table"""
+    scans = []
+    connection = db.session.connection()
+    for statement, parameters in statements:
+        if not statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+            continue
+        for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters):
+            detail = row[-1]
+            words = detail.split()
+            if (words[:1] == ['SCAN'] and words[1] in INDEXED_TABLES) or 'AUTOMATIC' in words:
+                scans.append((detail, statement))
+    return scans
+
+
+@pytest.fixture
+def tasks(user):
+    add_tasks(user, 30)
+    return Task.query.order_by(Task.id).all()
+
+
+@pytest.mark.parametrize('path', [
+    '/',
+    '/dashboard/tasks?urgency=overdue',
+    '/dashboard/tasks?urgency=later&task_type=quiz',
+    '/tasks',
+    '/api/tasks',
+    '/api/tasks?status=pending&due_before=2100-01-01',
+    '/api/courses',
+])
+def test_pages_use_indexes(client, tasks, path):
+    with recorded_statements() as statements:
+        assert client.get(path).status_code == 200
+    assert full_scans(statements) == []
+
+
+def test_task_updates_use_indexes(client, tasks):
+    with recorded_statements() as statements:
+        assert client.put(f'/tasks/{tasks[0].id}', json={'status': 'completed'}).status_code == 200
+        assert client.put('/api/tasks/batch', json=[{'id': tasks[1].id, 'priority': 'high'}]).status_code == 200
+        assert client.delete(f'/tasks/{tasks[2].id}').status_code == 200
+    assert full_scans(statements) == []
+
+
+def test_reminder_queries_use_indexes(app, tasks):
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    with recorded_statements() as statements:
+        check_and_send_notifications(mail, window_start=now, window_end=now + timedelta(days=1))
+        check_and_send_notifications(mail)
+        prune_sent_reminders(30)
+    assert full_scans(statements) == []
+
+
+def test_task_pages_are_read_in_index_order(client, tasks):
+    """Each /api/tasks page reads only its rows, without sorting all of the user's tasks"""
+    first = client.get('/api/tasks?limit=5').get_json()
+    for path in ['/api/tasks?limit=5', f'/api/tasks?limit=5&cursor={first["next_cursor"]}']:
+        with recorded_statements() as statements:
+            assert client.get(path).status_code == 200
+        connection = db.session.connection()
+        for statement, parameters in statements:
+            if ' FROM tasks' in statement:
+                plan = [row[-1] for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters)]
+                assert not any('TEMP B-TREE' in detail for detail in plan), plan
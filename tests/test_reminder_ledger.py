@@ -0,0 +1,76 @@
+"""
+Upkeep of the sent_reminders ledger: retention and the one-off orphan cleanup
+"""
+from datetime import date, timedelta
+
+from sqlalchemy import insert
+
+from conftest import add_tasks
+from database import SQLITE_SCHEMA_VERSION, migrate_sqlite
+from models import db, SentReminder, Task
+from notifications import OVERDUE_LOOKBACK_DAYS, prune_sent_reminders
+
+
+def add_sent_reminders(user, due_dates):
+    task = Task.query.filter_by(user_id=user.id).first()
+    db.session.add_all(
+        SentReminder(user_id=user.id, task_id=task.id, window='overdue', due_date=due_date)
+        for due_date in due_dates
+    )
+    db.session.commit()
+
+
+def remaining_due_dates():
+    return sorted(due_date for due_date, in db.session.query(SentReminder.due_date))
+
+
+def test_prune_deletes_rows_past_retention(app, user):
+    add_tasks(user, 1, courses=1)
+    today = date.today()
+    add_sent_reminders(user, [today - timedelta(days=days) for days in (40, 31, 30, 3)] + [today])
+    assert prune_sent_reminders(30) == 2
+    assert remaining_due_dates() == [today - timedelta(days=30), today - timedelta(days=3), today]
+
+
+def test_prune_keeps_rows_that_can_still_suppress_a_reminder(app, user):
+    add_tasks(user, 1, courses=1)
+    oldest_overdue = date.today() - timedelta(days=OVERDUE_LOOKBACK_DAYS)
+    add_sent_reminders(user, [oldest_overdue, oldest_overdue - timedelta(days=2)])
+    assert prune_sent_reminders(0) == 1
+    assert remaining_due_dates() == [oldest_overdue]
+
+
+def test_orphan_cleanup_runs_once(app, user):
+    add_tasks(user, 2, courses=1)
+    first, second = Task.query.filter_by(user_id=user.id).order_by(Task.id).all()
+    ledger_rows = [
+        {'user_id': user.id, 'task_id': task.id, 'window': 'overdue', 'due_date': date.today()}
+        for task in (first, second)
+    ]
+    db.session.remove()
+    
+    def delete_without_cascade(task_id):
+        # As an old database did, before foreign keys were enforced
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql('PRAGMA foreign_keys = OFF')
+            connection.exec_driver_sql('DELETE FROM tasks WHERE id = ?', (task_id,))
+            connection.exec_driver_sql('PRAGMA foreign_keys = ON')
+    
+    with db.engine.begin() as connection:
+        connection.execute(insert(SentReminder), ledger_rows[:1])
+        connection.exec_driver_sql('PRAGMA user_version = 0')
+    delete_without_cascade(first.id)
+    assert SentReminder.query.count() == 1
+    db.session.remove()
+    migrate_sqlite()
+    with db.engine.connect() as connection:
+        assert connection.exec_driver_sql('PRAGMA user_version').scalar() == SQLITE_SCHEMA_VERSION
+    assert SentReminder.query.count() == 0
+    db.session.remove()
+    
+    # Already migrated: later startups no longer scan the ledger
+    with db.engine.begin() as connection:
+        connection.execute(insert(SentReminder), ledger_rows[1:])
+    delete_without_cascade(second.id)
+    migrate_sqlite()
+    assert SentReminder.query.count() == 1
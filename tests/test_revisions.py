@@ -0,0 +1,119 @@
+"""
+Data revisions and the conditional GET validators built on them
+"""
+import time as clock
+from datetime import date, datetime, time, timezone
+
+import pytest
+from werkzeug.http import http_date, parse_date
+
+import revisions
+from conftest import add_tasks
+from models import db, Course, Task
+
+API_PATHS = ['/api/tasks', '/api/courses']
+
+
+def revision(user):
+    return revisions.get_revision(db.session, user.id)[0]
+
+
+@pytest.fixture
+def tasks(user):
+    add_tasks(user, 3, courses=1)
+    return Task.query.order_by(Task.id).all()
+
+
+@pytest.mark.parametrize('path', API_PATHS)
+def test_if_none_match_gets_304(client, tasks, path):
+    first = client.get(path)
+    assert first.status_code == 200
+    again = client.get(path, headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+    assert again.get_data() == b''
+    assert again.headers['ETag'] == first.headers['ETag']
+
+
+@pytest.mark.parametrize('path', API_PATHS)
+def test_if_modified_since_gets_304(client, tasks, path):
+    first = client.get(path)
+    again = client.get(path, headers={'If-Modified-Since': first.headers['Last-Modified']})
+    assert again.status_code == 304
+
+
+@pytest.mark.parametrize('path', API_PATHS)
+def test_validators_change_after_a_write(client, tasks, path):
+    first = client.get(path)
+    assert client.put(f'/tasks/{tasks[0].id}', json={'status': 'completed'}).status_code == 200
+    clock.sleep(1)  # Last-Modified has one-second resolution
+    assert client.put(f'/tasks/{tasks[0].id}', json={'priority': 'low'}).status_code == 200
+    again = client.get(path, headers={
+        'If-None-Match': first.headers['ETag'],
+        'If-Modified-Since': first.headers['Last-Modified'],
+    })
+    assert again.status_code == 200
+    assert again.headers['ETag'] != first.headers['ETag']
+    assert parse_date(again.headers['Last-Modified']) > parse_date(first.headers['Last-Modified'])
+
+
+def test_last_modified_is_no_older_than_local_midnight(client, tasks, monkeypatch):
+    # A zone far from UTC, so local midnight and UTC midnight differ
+    monkeypatch.setenv('TZ', 'Asia/Tokyo')
+    clock.tzset()
+    try:
+        user_id = tasks[0].user_id
+        db.session.execute(db.text('UPDATE users SET data_updated_at = :at WHERE id = :id'),
+                           {'at': datetime(2000, 1, 1), 'id': user_id})
+        db.session.commit()
+        response = client.get('/api/tasks')
+        local_midnight = datetime.combine(date.today(), time.min).astimezone(timezone.utc)
+        assert response.headers['Last-Modified'] == http_date(local_midnight)
+    finally:
+        monkeypatch.undo()
+        clock.tzset()
+
+
+@pytest.mark.parametrize('write', [
+    'add_task', 'update_task', 'delete_task', 'add_course', 'delete_course', 'batch_update', 'import',
+])
+def test_writes_bump_the_revision(client, user, tasks, write):
+    course = Course.query.filter_by(user_id=user.id).first()
+    before = revision(user)
+    if write == 'add_task':
+        response = client.post('/tasks', data={
+            'title': 'Lab report', 'due_date': '2026-05-01', 'task_type': 'assignment', 'course_id': course.id
+        })
+    elif write == 'update_task':
+        response = client.put(f'/tasks/{tasks[0].id}', json={'status': 'in-progress'})
+    elif write == 'delete_task':
+        response = client.delete(f'/tasks/{tasks[0].id}')
+    elif write == 'add_course':
+        response = client.post('/courses', data={'name': 'Databases'})
+    elif write == 'delete_course':
+        response = client.delete(f'/courses/{course.id}')
+    elif write == 'batch_update':
+        response = client.put('/api/tasks/batch', json=[{'id': task.id, 'priority': 'high'} for task in tasks])
+    else:
+        response = client.post('/api/tasks/import', json=[
+            {'title': 'Imported', 'due_date': '2026-05-02', 'task_type': 'quiz', 'course_id': course.id}
+        ])
+    assert response.status_code < 400
+    db.session.expire_all()
+    assert revision(user) > before
+
+
+def test_rolled_back_changes_do_not_bump(app, user, tasks, monkeypatch):
+    committed = []
+    monkeypatch.setattr(revisions, '_commit_callbacks', [committed.extend])
+    before = revision(user)
+    tasks[0].status = 'completed'
+    db.session.add(Course(name='Never saved', user_id=user.id))
+    db.session.flush()
+    db.session.rollback()
+    assert revision(user) == before
+    assert committed == []
+    
+    tasks[0].status = 'completed'
+    db.session.commit()
+    assert revision(user) == before + 1
+    assert committed == [user.id]